@@ -1,92 +1,376 @@
 import random
-import math
+import itertools
+from array import array
 from .game import state
+from referee.game import Action
+from referee.game.actions import decode_action
+from referee.game.ucb import ucb_select
+from referee.game.clock import out_of_time
 from . import game
-import copy
-
-class Node:
-    def __init__(self, currState: state, parent=None):
-        self.state = currState
-        self.parent = parent
-        self.children = []
-        self.visits = 0
-        self.score = 0
-        self.legal_actions = game.get_legal_actions(self.state)
-        self.action = None
-
-    def ucb1(self, c=1.98):
-        if self.visits == 0 or self.parent.visits == 0:
-            return math.inf
-        exploitation = self.score / self.visits
-        exploration = math.sqrt(math.log(self.parent.visits) / self.visits)
-        return exploitation + c * exploration
-
-    def select_best_child(self):
-        max_ucb1 = -math.inf
-        best_child = None
-        for child in self.children:
-            if child.ucb1() > max_ucb1:
-                max_ucb1 = child.ucb1()
-                best_child = child
-        return best_child
-
-    def expand(self):
-        action = random.choice(self.legal_actions)
-        new_state = copy.deepcopy(self.state)
-        new_state.update(action)
-        child_Node = Node(new_state, self)
-        # update the action down to this node
-        child_Node.action = action
-        self.children.append(child_Node)
-        return child_Node
-
-    def is_terminal(self):
-        return self.state.is_terminal()
-
-    # play the game to the end randomly
-    def rollout(self):
-        current_state = self.state
-        if current_state is not None:
-            while not current_state.is_terminal():
-                action = current_state.random_action()
-                current_state.update(action)
-            if current_state.get_winner() == self.state.color:
-                return 1
-            elif current_state.get_winner() is None:
-                return 0
-            else:
-                return 0
+
+# The tree is stored as a struct of arrays: node i is the i-th entry of each
+# of the arrays below, and nodes refer to each other by index. A node's
+# children form a linked list (first_child, then next_sibling), newest
+# first. Nodes don't hold a state: the search walks a single state up and
+# down the tree (push on the way down, pop on the way back up), and a node's
+# untried actions are worked out from that state when the node is expanded,
+# so only their number is stored. A node takes 29 bytes.
+NO_NODE = -1
+ROOT = 0
+_ARRAYS = ("parent", "action", "visits", "score", "first_child",
+           "next_sibling", "untried", "proof")
+
+# MCTS-Solver: nodes whose outcome is known are marked as proven, with the
+# value of the game for us (the search's colour, as the scores are). A
+# terminal node is proven by its winner when it is added. Where we are to
+# move, a node is proven won as soon as one of its children is; where the
+# opponent is, proven lost as soon as one of its children is; and either way
+# proven once all its actions have been tried and all its children proven,
+# at the best (or worst) of their values. Proofs are backed up to the root
+# after each iteration. A proven node is never simulated again: it is scored
+# by its value when it is reached, selection leaves out the children proven
+# bad for the player to move, and the search stops once the root is solved.
+PROVEN_LOSS = 1
+PROVEN_DRAW = 2
+PROVEN_WIN = 3
+
+
+class Tree:
+    def __init__(self, currState: state):
+        self.parent = array('i')
+        self.action = array('h')  # the action id leading to the node
+        self.visits = array('i')
+        self.score = array('d')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.untried = array('H')  # the number of actions not tried yet
+        self.proof = array('b')  # the proven value, or 0
+        self.add(NO_NODE, -1, currState)
+
+    def __len__(self):
+        return len(self.parent)
+
+    # add a node for the position of currState, as the newest child of parent
+    def add(self, parent, action, currState: state):
+        node = len(self.parent)
+        self.parent.append(parent)
+        self.action.append(action)
+        self.visits.append(0)
+        self.score.append(0.0)
+        self.first_child.append(NO_NODE)
+        self.untried.append(currState.get_board().legal_action_count())
+        self.proof.append(terminal_proof(currState))
+        if parent == NO_NODE:
+            self.next_sibling.append(NO_NODE)
+        else:
+            self.next_sibling.append(self.first_child[parent])
+            self.first_child[parent] = node
+        return node
+
+    def children(self, node):
+        child = self.first_child[node]
+        while child != NO_NODE:
+            yield child
+            child = self.next_sibling[child]
+
+    # the child with the highest UCB1 value (an unvisited one first), leaving
+    # out the children proven to be `bad`, or NO_NODE if there are none.
+    # `ours` says whether we are to move at the node: where the opponent is,
+    # the children's scores (ours) count against them.
+    def select_best_child(self, node, c=1.98, bad=0, ours=True):
+        child = self.first_child[node]
+        if child == NO_NODE or self.next_sibling[child] == NO_NODE \
+                and self.proof[child] != bad:
+            return child  # no choice to make
+        children = []
+        while child != NO_NODE:
+            if self.proof[child] != bad:
+                children.append(child)
+            child = self.next_sibling[child]
+        if not children:
+            return NO_NODE
+        return children[ucb_select(
+            children, self.visits, self.score, self.visits[node], c,
+            minimise=not ours)]
+
+    # currState must be at this node's position, and is moved to the new
+    # child's (one of the actions not tried yet)
+    def expand(self, node, currState: state):
+        tried = {self.action[child] for child in self.children(node)}
+        action = random.choice([
+            action for action in game.get_legal_action_ids(currState)
+            if action not in tried
+        ])
+        self.untried[node] -= 1
+        currState.push(action)
+        return self.add(node, action, currState)
+
+    # (the root is counted too: its children's UCB1 needs its visits)
+    def backPropagate(self, node, score):
+        while node != NO_NODE:
+            self.visits[node] += 1
+            self.score[node] += score
+            node = self.parent[node]
+
+    # the proven value of a node from its children's, where `ours` says
+    # whether we are to move there (0 if not proven)
+    def children_proof(self, node, ours):
+        decisive = PROVEN_WIN if ours else PROVEN_LOSS
+        pick = max if ours else min
+        best = None
+        for child in self.children(node):
+            proof = self.proof[child]
+            if proof == decisive:
+                return decisive
+            if not proof:
+                best = 0  # (still looking for a decisive one)
+            elif best != 0:
+                best = proof if best is None else pick(best, proof)
+        if self.untried[node] or not best:
+            return 0
+        return best
+
+    # back the proof of a (proven) node up to its ancestors, as far as it
+    # goes, where `ours` says whether we are to move at the node
+    def backPropagateProof(self, node, ours):
+        node = self.parent[node]
+        while node != NO_NODE and not self.proof[node]:
+            ours = not ours
+            proof = self.children_proof(node, ours)
+            if not proof:
+                return
+            self.proof[node] = proof
+            node = self.parent[node]
+
+    # the action id of the best child of the root to play, by UCB1 unless
+    # the search proved some outcome
+    def best_action(self):
+        for child in self.children(ROOT):
+            if self.proof[child] == PROVEN_WIN:
+                return self.action[child]
+        best_child = self.select_best_child(ROOT, bad=PROVEN_LOSS)
+        if best_child == NO_NODE:
+            best_child = self.select_best_child(ROOT)  # all lost
+        return self.action[best_child]
+
+    # add a virtual loss to this node and its ancestors, or take it off again
+    # with a negative loss, so that other selections in the same batch are
+    # steered away from this path. `ours` says whether we are to move at the
+    # node. It is a loss for the player choosing each node: a visit with no
+    # score where that is us, and a visit won by us where it is the opponent.
+    def virtualLoss(self, node, loss, ours):
+        while node != NO_NODE:
+            self.visits[node] += loss
+            if ours:  # (the opponent chose this node)
+                self.score[node] += loss
+            ours = not ours
+            node = self.parent[node]
+
+    # the action id leading to a node
+    def get_last_action(self, node):
+        return self.action[node]
+
+    # a new tree holding the subtree below a node (with the node as its root),
+    # packed into arrays of its own
+    def subtree(self, node):
+        tree = Tree.__new__(Tree)
+        for name in _ARRAYS:
+            setattr(tree, name, array(getattr(self, name).typecode))
+        # copy the nodes in breadth-first order, keeping the children's order
+        old_nodes = [node]
+        new_index = {node: ROOT}
+        for old in old_nodes:
+            children = list(self.children(old))
+            for child in children:
+                new_index[child] = len(old_nodes)
+                old_nodes.append(child)
+        for old in old_nodes:
+            tree.parent.append(
+                NO_NODE if old == node else new_index[self.parent[old]])
+            tree.action.append(self.action[old])
+            tree.visits.append(self.visits[old])
+            tree.score.append(self.score[old])
+            tree.untried.append(self.untried[old])
+            tree.proof.append(self.proof[old])
+            first, sibling = self.first_child[old], self.next_sibling[old]
+            tree.first_child.append(
+                NO_NODE if first == NO_NODE else new_index[first])
+            tree.next_sibling.append(
+                NO_NODE if old == node or sibling == NO_NODE
+                else new_index[sibling])
+        return tree
+
+
+# the proven value of the position of currState if the game is over there,
+# or 0
+def terminal_proof(currState: state):
+    if not currState.is_terminal():
         return 0
+    winner = currState.get_winner()
+    if winner is None:
+        return PROVEN_DRAW
+    return PROVEN_WIN if winner == currState.color else PROVEN_LOSS
 
-    def backPropagate(self, score):
-        current_node = self
-        while current_node.parent is not None:
-            current_node.visits += 1
-            current_node.score += score
-            current_node = current_node.parent
-        pass
 
-    # get last action
-    def get_last_action(self):
-        return self.action
+# the children proven to be bad for the player to move at currState's
+# position (and whether that player is us)
+def _bad_proof(currState: state):
+    ours = currState.get_board().turn_color == currState.color
+    return (PROVEN_LOSS if ours else PROVEN_WIN), ours
+
+
+# play the game to the end randomly (currState is left unchanged). With
+# playouts > 1, return the fraction of that many random games won.
+def rollout(currState: state, playouts=1):
+    if playouts > 1:
+        return currState.rollout_mean(currState.color, playouts)
+    winner = currState.rollout()
+    if winner == currState.color:
+        return 1
+    elif winner is None:
+        return 0
+    else:
+        return 0
 
 
-def MCTS_search(Curr_state, iterMax=1000):
-    root = Node(Curr_state)
+# playouts is the number of random games used to evaluate each new node (they
+# are simulated together when numpy is available). tree is the tree to carry
+# on searching (see advance), whose root must be at the position of
+# Curr_state; a new tree is started if it's None. Given a deadline (see
+# referee.game.clock) the search runs until then instead of for iterMax
+# iterations. The selection only descends through nodes with no actions left
+# to try, and expands one of those actions otherwise, choosing by UCB1 for
+# whoever is to move.
+def MCTS_search(Curr_state, iterMax=1000, playouts=1, tree=None,
+                deadline=None):
+    if tree is None:
+        tree = Tree(Curr_state)
     # start build tree
-    for i in range(iterMax):
-        # selection
-        current_node = root
-        while current_node.children != []:
-            if not current_node.children:
-                break
-            current_node = current_node.select_best_child()
-        # expansion
-        if not current_node.is_terminal():
-            current_node = current_node.expand()
-        # simulation
-        score = current_node.rollout()
+    iterations = range(iterMax) if deadline is None else itertools.count()
+    for i in iterations:
+        if out_of_time(deadline, i) or tree.proof[ROOT]:
+            break
+        # number of actions pushed onto Curr_state this iteration
+        depth = 0
+        try:
+            # selection
+            current_node = ROOT
+            while not tree.untried[current_node] \
+                    and tree.first_child[current_node] != NO_NODE \
+                    and not tree.proof[current_node]:
+                bad, ours = _bad_proof(Curr_state)
+                child = tree.select_best_child(
+                    current_node, bad=bad, ours=ours)
+                if child == NO_NODE:
+                    break  # all solved, but not backed up yet
+                current_node = child
+                Curr_state.push(tree.action[current_node])
+                depth += 1
+            # expansion
+            if not tree.proof[current_node] and tree.untried[current_node]:
+                current_node = tree.expand(current_node, Curr_state)
+                depth += 1
+            # simulation (unless the outcome is known)
+            proof = tree.proof[current_node]
+            if proof:
+                score = int(proof == PROVEN_WIN)
+            else:
+                score = rollout(Curr_state, playouts)
+            # backpropagation
+            tree.backPropagate(current_node, score)
+            if proof:
+                tree.backPropagateProof(
+                    current_node, _bad_proof(Curr_state)[1])
+        finally:
+            # back to the root position
+            for _ in range(depth):
+                Curr_state.pop()
+    return decode_action(tree.best_action())
+
+
+# move the root of a tree along an action (an Action or an action id), keeping
+# the statistics of the subtree below it. The rest of the tree is let go of.
+# Returns None if the action hasn't been searched (or there is no tree).
+def advance(tree, action):
+    if tree is None:
+        return None
+    if isinstance(action, Action):
+        action = action.index
+    for child in tree.children(ROOT):
+        if tree.action[child] == action:
+            return tree.subtree(child)
+    return None
+
+
+# tree-parallel search: a single shared tree, but each step selects `batch`
+# leaves before any is evaluated. A virtual loss is put on the path to each
+# leaf as it is selected, so the next selections go elsewhere. The leaves'
+# positions are then played out together (as one numpy batch, see
+# game.rollout_boards), the virtual losses are taken off, and the results
+# are backpropagated. Leaves are selected as in MCTS_search.
+VIRTUAL_LOSS = 1
+
+
+def MCTS_search_batched(Curr_state, iterMax=1000, batch=16, tree=None,
+                        deadline=None):
+    if tree is None:
+        tree = Tree(Curr_state)
+    steps = range(max(1, iterMax // batch)) if deadline is None \
+        else itertools.count()
+    for i in steps:
+        if out_of_time(deadline, i) or tree.proof[ROOT]:
+            break
+        leaves = []
+        boards = []
+        try:
+            for _ in range(batch):
+                if tree.proof[ROOT]:
+                    break
+                # number of actions pushed onto Curr_state for this leaf
+                depth = 0
+                try:
+                    # selection
+                    current_node = ROOT
+                    while not tree.untried[current_node] \
+                            and tree.first_child[current_node] != NO_NODE \
+                            and not tree.proof[current_node]:
+                        bad, ours = _bad_proof(Curr_state)
+                        child = tree.select_best_child(
+                            current_node, bad=bad, ours=ours)
+                        if child == NO_NODE:
+                            break  # all solved, but not backed up yet
+                        current_node = child
+                        Curr_state.push(tree.action[current_node])
+                        depth += 1
+                    # expansion
+                    if tree.untried[current_node] \
+                            and not tree.proof[current_node]:
+                        current_node = tree.expand(current_node, Curr_state)
+                        depth += 1
+                    proof = tree.proof[current_node]
+                    if proof:
+                        # known outcome: backed up straight away, so the
+                        # rest of the batch already sees it
+                        tree.backPropagate(
+                            current_node, int(proof == PROVEN_WIN))
+                        tree.backPropagateProof(
+                            current_node, _bad_proof(Curr_state)[1])
+                        continue
+                    boards.append(Curr_state.get_board().copy())
+                    ours = _bad_proof(Curr_state)[1]
+                    tree.virtualLoss(current_node, VIRTUAL_LOSS, ours)
+                    leaves.append((current_node, ours))
+                finally:
+                    # back to the root position
+                    for _ in range(depth):
+                        Curr_state.pop()
+            # simulation, of all the leaves at once
+            scores = game.rollout_boards(boards, Curr_state.color) \
+                if boards else []
+        finally:
+            for leaf, ours in leaves:
+                tree.virtualLoss(leaf, -VIRTUAL_LOSS, ours)
         # backpropagation
-        current_node.backPropagate(score)
-    best_child = root.select_best_child()
-    return best_child.get_last_action()
+        for (leaf, _), score in zip(leaves, scores):
+            tree.backPropagate(leaf, score)
+    return decode_action(tree.best_action())
@@ -1,18 +1,31 @@
-import copy
 from typing import List
 
 from .board import Board
-from referee.game import \
-    PlayerColor, Action, SpawnAction, SpreadAction, HexPos, HexDir
-from referee.game.board import CellState
-from . import program
+from referee.game import Action
+from referee.game.actions import ACTIONS, decode_action
+from referee.game.playout import playout
 import random
 
+# batched rollouts need numpy, which may not be installed. It is only
+# imported for the first batch (see batch_engine): loading it adds tens of MB
+# to the peak memory which the referee counts against the space limit.
+_batch_engine = None
+
 # static values
 # the size of the board
 SIZE = 7
 # the max number of turns
 MAX_TURNS = 343
+# the rollout engine used by the search: "fast" for the dedicated playout
+# routine (referee.game.playout), or "board" to play out on the board itself
+# with push/pop
+ROLLOUT_ENGINE = "fast"
+# stop "fast" rollouts after this many plies (None to play to the end), and
+# score the position by power difference
+ROLLOUT_CUTOFF = None
+# the fewest boards rollout_boards plays out as a numpy batch: below this,
+# the batch's per-ply overhead makes it slower than the fast playouts
+BATCH_ROLLOUT_MIN = 256
 
 
 class state:
@@ -34,6 +47,37 @@ class state:
         self._board.apply_action(action)
         self._action = action
 
+    # search API: walk the board up and down the game tree in place, instead
+    # of copying the state. These don't record the last action.
+    def push(self, action):
+        self._board.push(action)
+
+    def pop(self):
+        self._board.pop()
+
+    def try_action(self, action):
+        return self._board.try_action(action)
+
+    # play random actions to the end of the game (see ROLLOUT_ENGINE), leaving
+    # the state as it was, and return the winner
+    def rollout(self):
+        if ROLLOUT_ENGINE == "fast":
+            return playout(self._board, random, ROLLOUT_CUTOFF)
+        return self._board.rollout(
+            lambda board: board.random_legal_action(random))
+
+    # play `playouts` random games to the end at once (all in one batch when
+    # numpy is available), and return the fraction of them won by color
+    def rollout_mean(self, color, playouts):
+        engine = batch_engine()
+        if engine is None:
+            wins = sum(self.rollout() == color for _ in range(playouts))
+            return wins / playouts
+        batch, rng = engine
+        winners = batch.BatchBoard.from_board(self._board, playouts) \
+            .play_random(rng)
+        return float((winners == color.value).mean())
+
     # random action
     def random_action(self):
         """
@@ -41,7 +85,7 @@ class state:
         """
         # get the color
         # get one random available action
-        action = random.choice(get_legal_actions(self))
+        action = self._board.random_legal_action(random)
         return action
 
     def get_board(self):
@@ -59,6 +103,9 @@ class state:
     def get_last_action(self):
         if self._action is None:
             return None
+        # actions played by the search are integer action ids
+        if isinstance(self._action, int):
+            return decode_action(self._action)
         return self._action
 
     @property
@@ -66,11 +113,14 @@ class state:
         return self._color
 
     def __deepcopy__(self, memodict={}):
-        new_state = state(self._color)
-        new_state._board = copy.deepcopy(self._board)
+        # bypass __init__, and copy the board's cells only (not its history)
+        new_state = state.__new__(state)
+        new_state._board = self._board.copy()
         new_state._turn = self._turn
+        new_state._color = self._color
         new_state._winner = self._winner
         new_state._action = self._action
+        new_state._action_list = self._action_list
         return new_state
 
 
@@ -78,37 +128,50 @@ def get_legal_actions(CurrState: state) -> List[Action]:
     """
     This function is used to get the legal actions.
     legal actions: all the positions player can spawn on. All the directions player can spread to.
-    have not finished yet.
+    The board keeps its empty and occupied cells up to date, so nothing is
+    rescanned (the action instances are shared, nothing is allocated).
+    """
+    board = CurrState.get_board()
+    return [ACTIONS[action] for action in board.legal_actions()]
+
+
+def get_legal_action_ids(CurrState: state) -> List[int]:
+    """
+    This function is used to get the legal actions as integer action ids
+    (see referee.game.actions), which is what the search tree stores. The
+    board applies ids directly, without validating them.
+    """
+    return list(CurrState.get_board().legal_actions())
+
+
+def rollout_boards(boards, color) -> List[int]:
+    """
+    This function is used to evaluate several positions at once: it plays
+    one random game to the end from each board (all in one batch when numpy
+    is available, and there are enough boards to make it pay), and returns 1
+    for each game won by color, 0 otherwise.
+    """
+    engine = batch_engine() if len(boards) >= BATCH_ROLLOUT_MIN else None
+    if engine is not None:
+        batch, rng = engine
+        winners = batch.BatchBoard.from_boards(boards).play_random(rng)
+        return [int(winner == color.value) for winner in winners]
+    return [int(playout(board, random, ROLLOUT_CUTOFF) == color)
+            for board in boards]
+
+
+def batch_engine():
+    """
+    This function is used to get what batched rollouts need: the
+    referee.game.batch module and a numpy random generator, as a pair, or
+    None when numpy isn't installed. numpy is imported on the first call.
     """
-    # get the board
-    CurrBoard = CurrState.get_board()
-    # get the color
-    color = CurrBoard.turn_color
-    # get the positions
-    positions = CurrBoard._state
-    # get the occupied positions
-    occupied_positions = get_same_color_list(positions, color)
-    # get the legal actions
-    legal_actions = []
-    # for Spread actions
-    for pos in occupied_positions:
-        # all the directions around the position
-        directions = [HexDir.Down, HexDir.DownLeft, HexDir.DownRight, HexDir.Up, HexDir.UpLeft, HexDir.UpRight]
-        for direction in directions:
-            legal_actions.append(SpreadAction(pos[0], direction))
-    # for Spawn actions
-    # all the position on the board that is not occupied when the total power is less than 49
-    if CurrBoard._total_power < 49:
-        for x in range(SIZE):
-            for y in range(SIZE):
-                if positions[HexPos(x, y)].player is None:
-                    legal_actions.append(SpawnAction(HexPos(x, y)))
-    return legal_actions
-
-
-def get_same_color_list(position_list: dict[HexPos, CellState], color) -> list[(HexPos, CellState)]:
-    same_color_list = []
-    for pos in position_list:
-        if position_list[pos].player == color:
-            same_color_list.append((pos, position_list[pos]))
-    return same_color_list
+    global _batch_engine
+    if _batch_engine is None:
+        try:
+            import numpy as np
+            from referee.game import batch
+            _batch_engine = batch, np.random.default_rng()
+        except ImportError:
+            _batch_engine = ()
+    return _batch_engine or None
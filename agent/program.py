@@ -3,10 +3,15 @@
 
 from referee.game import \
     PlayerColor, Action, SpawnAction, SpreadAction
+from referee.game.clock import move_deadline
 
 from . import game
 from . import MCTS
 
+# leaves selected per step of a tree-parallel search (see
+# MCTS.MCTS_search_batched), or 1 for the plain search
+TREE_BATCH = 1
+
 
 # This is the entry point for your game playing agent. Currently the agent
 # simply spawns a token at the centre of the board if playing as RED, and
@@ -21,6 +26,9 @@ class Agent:
         """
         self._color = color
         self._state = game.state(color)
+        # the search tree, kept from turn to turn (None until the first
+        # search, or after a move the tree hasn't searched)
+        self._tree = None
         match color:
             case PlayerColor.RED:
                 print("Testing: I am playing as red")
@@ -31,18 +39,31 @@ class Agent:
         """
         Return the next action to take.
         """
+        if self._tree is None:
+            self._tree = MCTS.Tree(self._state)
+        # search for as long as the time left allows, if it is limited
+        deadline = move_deadline(
+            self._state.get_board(), referee.get("time_remaining"))
+        if TREE_BATCH > 1:
+            return MCTS.MCTS_search_batched(
+                self._state, batch=TREE_BATCH, tree=self._tree,
+                deadline=deadline)
         match self._color:
             case PlayerColor.RED:
                 # use the MCTS to get the action
-                return MCTS.MCTS_search(self._state)
+                return MCTS.MCTS_search(
+                    self._state, tree=self._tree, deadline=deadline)
             case PlayerColor.BLUE:
                 # use the MCTS to get the action
-                return MCTS.MCTS_search(self._state)
+                return MCTS.MCTS_search(
+                    self._state, tree=self._tree, deadline=deadline)
 
     def turn(self, color: PlayerColor, action: Action, **referee: dict):
         """
         Update the agent with the last player's action.
         """
+        # keep the part of the tree below the action, for the next search
+        self._tree = MCTS.advance(self._tree, action)
         match action:
             case SpawnAction(cell):
                 # update the game
@@ -1,11 +1,9 @@
-import copy
 from typing import List
 
 from .board import Board
-from referee.game import \
-    PlayerColor, Action, SpawnAction, SpreadAction, HexPos, HexDir
-from referee.game.board import CellState
-from . import program
+from referee.game import Action
+from referee.game.actions import ACTIONS, decode_action
+from referee.game.playout import playout
 import random
 
 # static values
@@ -13,6 +11,13 @@ import random
 SIZE = 7
 # the max number of turns
 MAX_TURNS = 343
+# the rollout engine used by the search: "fast" for the dedicated playout
+# routine (referee.game.playout), or "board" to play out on the board itself
+# with push/pop
+ROLLOUT_ENGINE = "fast"
+# stop "fast" rollouts after this many plies (None to play to the end), and
+# score the position by power difference
+ROLLOUT_CUTOFF = None
 
 
 class state:
@@ -37,6 +42,26 @@ class state:
             self._game_over = True
             self._winner = self._board.winner_color
 
+    # search API: walk the board up and down the game tree in place, instead
+    # of copying the state. These don't record the last action.
+    def push(self, action):
+        self._board.push(action)
+        self._game_over = self._board.game_over
+        self._winner = self._board.winner_color
+
+    def pop(self):
+        self._board.pop()
+        self._game_over = self._board.game_over
+        self._winner = self._board.winner_color
+
+    # play random actions to the end of the game (see ROLLOUT_ENGINE), leaving
+    # the state as it was, and return the winner
+    def rollout(self):
+        if ROLLOUT_ENGINE == "fast":
+            return playout(self._board, random, ROLLOUT_CUTOFF)
+        return self._board.rollout(
+            lambda board: board.random_legal_action(random))
+
     # random action
     def random_action(self):
         """
@@ -44,7 +69,7 @@ class state:
         """
         # get the color
         # get one random available action
-        action = random.choice(get_legal_actions(self))
+        action = self._board.random_legal_action(random)
         # update the board
         self.update(action)
         return action
@@ -64,17 +89,23 @@ class state:
     def get_last_action(self):
         if self._action is None:
             return None
+        # actions played by the search are integer action ids
+        if isinstance(self._action, int):
+            return decode_action(self._action)
         return self._action
 
     # set up action list
     # get action list
 
     def __deepcopy__(self, memodict={}):
-        new_state = state(self.color)
-        new_state._board = copy.deepcopy(self._board)
+        # bypass __init__, and copy the board's cells only (not its history)
+        new_state = state.__new__(state)
+        new_state._board = self._board.copy()
         new_state._turn = self._turn
+        new_state.color = self.color
         new_state._winner = self._winner
         new_state._action = self._action
+        new_state._game_over = self._game_over
         return new_state
 
 
@@ -82,37 +113,17 @@ def get_legal_actions(CurrState: state) -> List[Action]:
     """
     This function is used to get the legal actions.
     legal actions: all the positions player can spawn on. All the directions player can spread to.
-    have not finished yet.
+    The board keeps its empty and occupied cells up to date, so nothing is
+    rescanned (the action instances are shared, nothing is allocated).
+    """
+    board = CurrState.get_board()
+    return [ACTIONS[action] for action in board.legal_actions()]
+
+
+def get_legal_action_ids(CurrState: state) -> List[int]:
+    """
+    This function is used to get the legal actions as integer action ids
+    (see referee.game.actions), which is what the search tree stores. The
+    board applies ids directly, without validating them.
     """
-    # get the board
-    CurrBoard = CurrState.get_board()
-    # get the color
-    color = CurrBoard.turn_color
-    # get the positions
-    positions = CurrBoard._state
-    # get the occupied positions
-    occupied_positions = get_same_color_list(positions, color)
-    # get the legal actions
-    legal_actions = []
-    # for Spread actions
-    for pos in occupied_positions:
-        # all the directions around the position
-        directions = [HexDir.Down, HexDir.DownLeft, HexDir.DownRight, HexDir.Up, HexDir.UpLeft, HexDir.UpRight]
-        for direction in directions:
-            legal_actions.append(SpreadAction(pos[0], direction))
-    # for Spawn actions
-    # all the position on the board that is not occupied when the total power is less than 49
-    if CurrBoard._total_power < 49:
-        for x in range(SIZE):
-            for y in range(SIZE):
-                if positions[HexPos(x, y)].player is None:
-                    legal_actions.append(SpawnAction(HexPos(x, y)))
-    return legal_actions
-
-
-def get_same_color_list(position_list: dict[HexPos, CellState], color) -> list[(HexPos, CellState)]:
-    same_color_list = []
-    for pos in position_list:
-        if position_list[pos].player == color:
-            same_color_list.append((pos, position_list[pos]))
-    return same_color_list
+    return list(CurrState.get_board().legal_actions())
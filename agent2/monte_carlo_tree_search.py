@@ -1,224 +1,362 @@
 import random
 import math
+import itertools
+from array import array
 from .game import state
+from referee.game import Action
+from referee.game.actions import decode_action
+from referee.game.ucb import ucb_select
+from referee.game.clock import out_of_time
 from . import game
-import copy
-
-
-class Node:
-    def __init__(self, currState: state, parent=None):
-        self.state = currState
-        self.parent = parent
-        self.children = []
-        self.visits = 0
-        self.score = 0
-        self.action_list = game.get_legal_actions(self.state)
-        self.action = None
-        self.depth = 0
-        self.turn_color = self.state.color
-
-    def ucb1(self, c=1):
-        if self.visits == 0:
-            return math.inf
-        exploitation = self.score / self.visits
-        exploration = math.sqrt(math.log(self.parent.visits) / self.visits)
-        return exploitation + c * exploration
-
-    # apply one random legal action to the state
-    def apply_action(self, action):
-        self.state.update(action)
-        self.action = action
-        self.turn_color = self.state.color
-
-    def select_best_child(self, children: dict):
-        max_ucb1 = -math.inf
-        best_child = None
-        for child, ucb1 in children.items():
-            if ucb1 > max_ucb1:
-                # ensure the child is available to expand
-                if child.action_list or child.is_terminal():
-                    max_ucb1 = child.ucb1()
-                    best_child = child
-        return best_child
-
-    # select
-    def select(self, node):
-        path = []
-        while True:
-            path.append(node)
-            if node not in self.children or not self.children[node]:
-                # node is either unexplored or terminal
-                return path
-            unexplored = self.children[node] - self.children.keys()
-            if unexplored:
-                n = unexplored.pop()
-                path.append(n)
-                return path
-            node = self._uct_select(node)  # descend a layer deeper
-
-    def expand(self, children: dict):
-        # copy current state and update it
-        new_state = copy.deepcopy(self.state)
-        # create a new node
-        child_Node = Node(new_state, self)
-        # get and remove action form the action list
-        action = random.choice(self.action_list)
-        self.action_list.remove(action)
-        # update the action down to this node
-        child_Node.apply_action(action)
-        # update the action_list
-        child_Node.action_list = game.get_legal_actions(child_Node.state)
-        child_Node.depth = self.depth + 1
-        self.children.append(child_Node)
-        children[child_Node] = child_Node.ucb1()
-        return child_Node
-
-    def find_children(self, CurrNode):
-        if CurrNode in self.children:
-            return
-        for action in self.action_list:
-            new_state = copy.deepcopy(self.state)
-            new_state.update(action)
-            child_Node = Node(new_state, self)
-            child_Node.action = action
-            child_Node.action_list = game.get_legal_actions(child_Node.state)
-            child_Node.depth = self.depth + 1
-            self.children.append(child_Node)
-        return self.children
-
-    def is_terminal(self):
-        return self.state.is_terminal()
-
-    # play the game to the end randomly
-    def rollout(self):
-        current_state = self.state
-        if current_state is not None:
-            simulate_state = copy.deepcopy(current_state)
-            while not simulate_state.is_terminal():
-                simulate_state.random_action()
-            if simulate_state.get_winner() == self.state.color:
-                return simulate_state.color, 1
-            elif simulate_state.get_winner() is None:
-                return simulate_state.color, 0
-            else:
-                return simulate_state.color, 0
-        return 0
 
-    def backPropagate(self, result, score):
-        current_node = self
-        while True:
-            current_node.visits += 1
-            if current_node.turn_color == result:
-                current_node.score += score
-            current_node = current_node.parent
-            if current_node.parent is None:
-                current_node.visits += 1
-                if current_node.turn_color == result:
-                    current_node.score += score
-                break
-        pass
+
+# The tree is stored as a struct of arrays: node i is the i-th entry of each
+# of the arrays below, and nodes refer to each other by index. Nodes don't
+# hold a state: the search walks a single state up and down the tree (push on
+# the way down, pop on the way back up), so currState below is always that
+# state, positioned at the node in question.
+#
+# Children are made lazily, one per visit: when a node is expanded, only the
+# ids of its legal actions are stored (in the shared `untried` array, from
+# untried_start, untried_count of them), and a child is made for one of them
+# at a time. A node's children form a linked list (first_child, then
+# next_sibling), newest first. A node takes 36 bytes, plus 2 per action it
+# hasn't tried yet.
+NO_NODE = -1
+ROOT = 0
+_ARRAYS = ("parent", "action", "visits", "score", "first_child",
+           "next_sibling", "child_count", "terminal", "untried_start",
+           "untried_count", "proof")
+
+# MCTS-Solver: nodes whose outcome is known are marked as proven, with the
+# value of the game for us (the search's colour, as the scores are). A
+# terminal node is proven by its winner when it is added. Where we are to
+# move, a node is proven won as soon as one of its children is; where the
+# opponent is, proven lost as soon as one of its children is; and either way
+# proven once all its actions have been tried and all its children proven,
+# at the best (or worst) of their values. Proofs are backed up the path after
+# each iteration. A proven node is never simulated again: it is scored by its
+# value when it is reached, selection leaves out the children proven bad for
+# the player to move, and the search stops once the root is solved.
+PROVEN_LOSS = 1
+PROVEN_DRAW = 2
+PROVEN_WIN = 3
+
+
+class Tree:
+    def __init__(self, currState: state):
+        self.parent = array('i')
+        self.action = array('h')  # the action id leading to the node
+        self.visits = array('i')
+        self.score = array('d')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.child_count = array('H')
+        self.terminal = array('b')
+        self.untried_start = array('i')  # NO_NODE until expanded
+        self.untried_count = array('H')
+        self.untried = array('h')  # the untried action ids of all nodes
+        self.proof = array('b')  # the proven value, or 0
+        self.add(NO_NODE, -1, currState)
+
+    def __len__(self):
+        return len(self.parent)
+
+    # add a node for the position of currState, as the newest child of parent
+    def add(self, parent, action, currState: state):
+        node = len(self.parent)
+        self.parent.append(parent)
+        self.action.append(action)
+        self.visits.append(0)
+        self.score.append(0.0)
+        self.first_child.append(NO_NODE)
+        self.child_count.append(0)
+        self.terminal.append(currState.is_terminal())
+        self.untried_start.append(NO_NODE)
+        self.untried_count.append(0)
+        self.proof.append(terminal_proof(currState))
+        if parent == NO_NODE:
+            self.next_sibling.append(NO_NODE)
+        else:
+            self.next_sibling.append(self.first_child[parent])
+            self.first_child[parent] = node
+            self.child_count[parent] += 1
+        return node
+
+    def children(self, node):
+        child = self.first_child[node]
+        while child != NO_NODE:
+            yield child
+            child = self.next_sibling[child]
+
+    def is_expanded(self, node):
+        return self.untried_start[node] != NO_NODE
+
+    # store the legal actions of a node, as its untried actions (no children
+    # are made yet)
+    def expand(self, node, currState: state):
+        actions = game.get_legal_action_ids(currState)
+        self.untried_start[node] = len(self.untried)
+        self.untried_count[node] = len(actions)
+        self.untried.extend(actions)
+
+    # make a child of a node for one of its untried actions (picked at
+    # random), moving currState to it
+    def add_child(self, node, currState: state):
+        start, count = self.untried_start[node], self.untried_count[node]
+        pick = start + random.randrange(count)
+        last = start + count - 1
+        action = self.untried[pick]
+        self.untried[pick] = self.untried[last]
+        self.untried_count[node] = count - 1
+        currState.push(action)
+        return self.add(node, action, currState)
+
+    def is_terminal(self, node):
+        return self.terminal[node]
+
+    # the proven value of a node from its children's, where `ours` says
+    # whether we are to move there (0 if not proven)
+    def children_proof(self, node, ours):
+        decisive = PROVEN_WIN if ours else PROVEN_LOSS
+        pick = max if ours else min
+        best = None
+        for child in self.children(node):
+            proof = self.proof[child]
+            if proof == decisive:
+                return decisive
+            if not proof:
+                best = 0  # (still looking for a decisive one)
+            elif best != 0:
+                best = proof if best is None else pick(best, proof)
+        if not self.is_expanded(node) or self.untried_count[node] or not best:
+            return 0
+        return best
+
+    def backPropagate(self, node, score):
+        while node != NO_NODE:
+            self.visits[node] += 1
+            self.score[node] += score
+            node = self.parent[node]
 
     # get last action
-    def get_last_action(self):
-        return self.action
+    def get_last_action(self, node):
+        if self.action[node] < 0:
+            return None
+        return decode_action(self.action[node])
 
-    # get the best action
-    def get_best_action(self):
-        max_ucb1 = -math.inf
-        best_child = None
-        for child in self.children:
-            if child.ucb1() > max_ucb1:
-                max_ucb1 = child.ucb1()
-                best_child = child
-        return best_child.get_last_action()
+    # a new tree holding the subtree below a node (with the node as its root),
+    # packed into arrays of its own
+    def subtree(self, node):
+        tree = Tree.__new__(Tree)
+        for name in _ARRAYS + ("untried",):
+            setattr(tree, name, array(getattr(self, name).typecode))
+        # copy the nodes in breadth-first order, keeping the children's order
+        old_nodes = [node]
+        new_index = {node: ROOT}
+        for old in old_nodes:
+            for child in self.children(old):
+                new_index[child] = len(old_nodes)
+                old_nodes.append(child)
+        for old in old_nodes:
+            for name in _ARRAYS:
+                getattr(tree, name).append(getattr(self, name)[old])
+            tree.parent[-1] = \
+                NO_NODE if old == node else new_index[self.parent[old]]
+            first, sibling = self.first_child[old], self.next_sibling[old]
+            tree.first_child[-1] = \
+                NO_NODE if first == NO_NODE else new_index[first]
+            tree.next_sibling[-1] = NO_NODE \
+                if old == node or sibling == NO_NODE else new_index[sibling]
+            start = self.untried_start[old]
+            if start != NO_NODE:
+                tree.untried_start[-1] = len(tree.untried)
+                tree.untried.extend(
+                    self.untried[start:start + self.untried_count[old]])
+        return tree
+
+
+# the proven value of the position of currState if the game is over there,
+# or 0
+def terminal_proof(currState: state):
+    if not currState.is_terminal():
+        return 0
+    winner = currState.get_winner()
+    if winner is None:
+        return PROVEN_DRAW
+    return PROVEN_WIN if winner == currState.color else PROVEN_LOSS
+
+
+# play the game to the end randomly (currState is left unchanged), and
+# return 1 if we won, 0 otherwise
+def rollout(currState: state):
+    winner = currState.rollout()
+    if winner == currState.color:
+        return 1
+    else:
+        return 0
 
 
 class MCTS:
-    def __init__(self, exploration_weight=1):
-        self.children = dict()  # children of each node
+    # With widening set (progressive widening), a node with n visits may
+    # have at most ceil(widening * n ** widening_power) children, so that
+    # children are only added as the node is found worth searching. Without
+    # it, all of a node's actions are tried before any is searched deeper.
+    def __init__(self, exploration_weight=1, widening=None,
+                 widening_power=0.5):
         self.exploration_weight = exploration_weight
+        self.widening = widening
+        self.widening_power = widening_power
+        # the tree, rooted at the current position and kept from turn to turn
+        # (see advance), or None to start a new tree at the next search
+        self.tree = None
 
-    # choose the best action
+    # choose the best child of node
     def choose(self, node):
-        if node.is_terminal():
+        tree = self.tree
+        if tree.is_terminal(node):
             raise RuntimeError(f"choose called on terminal node {node}")
 
-        if node not in self.children:
-            return node.find_random_child()
+        if not tree.child_count[node]:
+            raise RuntimeError(f"choose called on unexpanded node {node}")
 
         def score(Cur_node):
-            if Cur_node.visits == 0:
+            if tree.proof[Cur_node] == PROVEN_WIN:
+                return float("inf")  # a forced win
+            if tree.proof[Cur_node] == PROVEN_LOSS:
+                return float("-inf")
+            if tree.visits[Cur_node] == 0:
                 return float("-inf")  # avoid unseen moves
-            return Cur_node.score / Cur_node.visits  # average reward
+            return tree.score[Cur_node] / tree.visits[Cur_node]  # average reward
 
         max_node = None
         max_score = -math.inf
-        for child in self.children[node]:
+        for child in tree.children(node):
             child_score = score(child)
-            if child_score > max_score:
+            # (the first child, if all are lost)
+            if max_node is None or child_score > max_score:
                 max_node = child
                 max_score = child_score
         return max_node
 
-    # do rollout
-    def do_rollout(self, node):
+    # do rollout (currState must be at the position of node)
+    def do_rollout(self, node, currState):
         "Make the tree one layer better. (Train for one iteration.)"
-        path = self._select(node)
-        leaf = path[-1]
-        self._expand(leaf)
-        reward = leaf.rollout()
-        leaf.backPropagate(reward)
-
-    def _select(self, node):
-        "Find an unexplored descendent of `node`"
         path = []
+        try:
+            self._select(node, currState, path)
+            leaf = path[-1]
+            proof = self.tree.proof[leaf]
+            if proof:
+                reward = int(proof == PROVEN_WIN)
+            else:
+                self._expand(leaf, currState)
+                reward = rollout(currState)
+            self.tree.backPropagate(leaf, reward)
+            if proof:
+                self._prove_ancestors(path, currState)
+        finally:
+            # back to the root position
+            for _ in range(len(path) - 1):
+                currState.pop()
+
+    def _select(self, node, currState, path):
+        "Find an unexplored descendent of `node`, moving `currState` to it"
+        tree = self.tree
         while True:
             path.append(node)
-            if node not in self.children or not self.children[node]:  # 如果当前节点不在children字典中，或者当前节点的子节点为空（没有子节点）
-                # node is either unexplored or terminal
+            if not tree.is_expanded(node) or tree.proof[node]:  # 如果当前节点还没有展开，或者结果已经确定
+                # node is either unexplored or solved (e.g. terminal)
                 return path
-            unexplored = self.children[node] - self.children.keys()  # 得到所有当前子节点中尚未加入children的（即未被探索的）集合
-            if unexplored:
-                n = unexplored.pop()  # 随机选取一个未被探索的子节点
+            # (children proven bad for the player to move are never chosen)
+            ours = currState.get_board().turn_color == currState.color
+            bad = PROVEN_LOSS if ours else PROVEN_WIN
+            children = [n for n in tree.children(node) if tree.proof[n] != bad]
+            if tree.untried_count[node] \
+                    and (not children or self._can_widen(node)):  # 还有没试过的动作：为其中一个加入新的子节点
+                n = tree.add_child(node, currState)
                 path.append(n)
                 return path
-            node = self._uct_select(node)  # descend a layer deeper
+            if not children:
+                # no actions at all (or all solved, but not backed up yet)
+                return path
+            node = self._uct_select(node, children, ours)  # descend a layer deeper
+            currState.push(tree.action[node])
 
-    def _expand(self, node):
-        "Update the `children` dict with the children of `node`"
-        if node in self.children:
-            return  # already expanded
-        self.children[node] = node.find_children()  # 加入children字典， 同时在value总加入它的所有的子节点
+    def _prove_ancestors(self, path, currState):
+        "Back the proof of the leaf up the path, as far as it goes"
+        tree = self.tree
+        # whether we are to move at each node of the path, up from the leaf
+        ours = currState.get_board().turn_color == currState.color
+        for node in reversed(path[:-1]):
+            ours = not ours
+            if tree.proof[node]:
+                return
+            proof = tree.children_proof(node, ours)
+            if not proof:
+                return
+            tree.proof[node] = proof
 
-    def _uct_select(self, node):
-        "Select a child of node, balancing exploration & exploitation"
+    def _can_widen(self, node):
+        "Whether `node` may have another child"
+        if self.widening is None:
+            return True
+        limit = math.ceil(
+            self.widening * self.tree.visits[node] ** self.widening_power)
+        return self.tree.child_count[node] < limit
 
-        # All children of node should already be expanded:
-        assert all(n in self.children for n in self.children[node])
+    def _expand(self, node, currState):
+        "Store the untried actions of `node`"
+        if self.tree.is_expanded(node):
+            return  # already expanded
+        self.tree.expand(node, currState)
+
+    def _uct_select(self, node, children, ours=True):
+        "Select one of the children of node, balancing exploration & exploitation"
+        tree = self.tree
 
-        log_N_vertex = math.log(self.N[node])
+        # All children of node should already have been visited:
+        assert all(tree.visits[n] for n in children)
 
-        def uct(n):
-            "Upper confidence bound for trees"
-            return self.Q[n] / self.N[n] + self.exploration_weight * math.sqrt(
-                log_N_vertex / self.N[n]
-            )
+        # The scores are ours: where the opponent is to move (not `ours`),
+        # they count against a child.
+        return children[ucb_select(children, tree.visits, tree.score,
+                                   tree.visits[node],
+                                   self.exploration_weight,
+                                   minimise=not ours)]
 
-        return max(self.children[node], key=uct)  # 从当前节点的所有子节点中选取一个uct值最大的节点
+    # given a deadline (see referee.game.clock), search until then instead
+    # of for iterMax iterations
+    def MCTS_search(self, currState, iterMax=100, deadline=None):
+        # carry on with the tree kept from the last turns, if there is one
+        if self.tree is None:
+            self.tree = Tree(currState)
+        iterations = range(iterMax) if deadline is None else itertools.count()
+        for i in iterations:
+            if out_of_time(deadline, i) or self.tree.proof[ROOT]:
+                break
+            self.do_rollout(ROOT, currState)
+        return self.tree.get_last_action(self.choose(ROOT))
 
-    def MCTS_search(self, iterMax=100):
-        root = Node(self)
-        mcts = MCTS()
-        for i in range(iterMax):
-            mcts.do_rollout(root)
-        return mcts.choose(root).get_last_action()
+    # move the root along an action (an Action or an action id) played in
+    # the game, keeping the subtree below it and dropping the rest
+    def advance(self, action):
+        if self.tree is None:
+            return
+        if isinstance(action, Action):
+            action = action.index
+        for child in self.tree.children(ROOT):
+            if self.tree.action[child] == action:
+                self.tree = self.tree.subtree(child)
+                return
+        # not searched: start again at the next search
+        self.tree = None
 
 
-def check_tree(root: Node):
-    print('root.depth: ', root.depth, 'root.score: ', root.score, 'root.visits: ', root.visits)
-    print('root.ucb1()\n: ', root.ucb1(), 'node number: ', len(root.children))
-    print('root.action: ', root.action)
-    print('root.board: ', root.state.print_board())
-    for child in root.children:
-        check_tree(child)
+def check_tree(tree: Tree, node=ROOT, depth=0):
+    print('node.depth: ', depth, 'node.score: ', tree.score[node], 'node.visits: ', tree.visits[node])
+    print('node number: ', tree.child_count[node])
+    print('node.action: ', tree.get_last_action(node))
+    for child in tree.children(node):
+        check_tree(tree, child, depth + 1)
     pass
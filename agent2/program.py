@@ -3,10 +3,14 @@
 
 from referee.game import \
     PlayerColor, Action, SpawnAction, SpreadAction
+from referee.game.clock import move_deadline
 
 from . import game
 from .monte_carlo_tree_search import MCTS
 
+# the search's progressive widening factor (see MCTS), or None to try all of
+# a node's actions before searching any of them deeper
+WIDENING = None
 
 
 # This is the entry point for your game playing agent. Currently the agent
@@ -22,7 +26,7 @@ class Agent:
         """
         self._color = color
         self._state = game.state(color)
-        self.tree = MCTS()
+        self.tree = MCTS(widening=WIDENING)
         match color:
             case PlayerColor.RED:
                 print("Testing: I am playing as red")
@@ -33,21 +37,23 @@ class Agent:
         """
         Return the next action to take.
         """
+        # search for as long as the time left allows, if it is limited
+        deadline = move_deadline(
+            self._state.get_board(), referee.get("time_remaining"))
         match self._color:
             case PlayerColor.RED:
                 # use the MCTS to get the action
-                for i in range(100):
-                    self.tree.do_rollout(self._state)
-                action = self.tree.choose(self._state)
-                return action
+                return self.tree.MCTS_search(self._state, deadline=deadline)
             case PlayerColor.BLUE:
                 # use the MCTS to get the action
-                return MCTS.MCTS_search(self._state)
+                return self.tree.MCTS_search(self._state, deadline=deadline)
 
     def turn(self, color: PlayerColor, action: Action, **referee: dict):
         """
         Update the agent with the last player's action.
         """
+        # keep the part of the tree below the action, for the next search
+        self.tree.advance(action)
         match action:
             case SpawnAction(cell):
                 # update the game
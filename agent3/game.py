@@ -1,18 +1,33 @@
-import copy
 from typing import List
 
 from .board import Board
-from referee.game import \
-    PlayerColor, Action, SpawnAction, SpreadAction, HexPos, HexDir
-from referee.game.board import CellState
-from . import program
+from referee.game import Action, IllegalActionException
+from referee.game.actions import ACTIONS, decode_action
+from referee.game.playout import playout
+from referee.game.symmetry import IDENTITY, transform_action
+from referee.game.tables import ZOBRIST_TURNS
 import random
 
+# batched rollouts need numpy, which may not be installed. It is only
+# imported for the first batch (see batch_engine): loading it adds tens of MB
+# to the peak memory which the referee counts against the space limit.
+_batch_engine = None
+
 # static values
 # the size of the board
 SIZE = 7
 # the max number of turns
 MAX_TURNS = 343
+# the rollout engine used by the search: "fast" for the dedicated playout
+# routine (referee.game.playout), or "board" to play out on the board itself
+# with push/pop
+ROLLOUT_ENGINE = "fast"
+# stop "fast" rollouts after this many plies (None to play to the end), and
+# score the position by power difference
+ROLLOUT_CUTOFF = None
+# check that every action id the search pushes is legal (the board trusts
+# them), and raise IllegalActionException if not: for debugging only
+CHECK_PUSHES = False
 
 
 class state:
@@ -25,34 +40,72 @@ class state:
         self._winner = None
         self._action = None
         self._game_over = False
-        self._action_list = get_legal_actions(self)
+        self._action_list = get_legal_action_ids(self)
         self._depth = 0
 
-    def find_children(self):
-        children = []
-        self._action_list = get_legal_actions(self)
+    # the position key, and the transform into the key's frame. In the first
+    # symmetry_plies turns of the game, symmetric positions (torus
+    # translations, rotations and reflections) share a key. The canonical
+    # key is the plain key of the canonical form, so the two kinds of key can
+    # be mixed. After that, a position is keyed in the frame of its parent's
+    # key (the transform `frame`): the key of its image under that transform.
+    # So the children of a canonical position are the same positions, with
+    # the same keys, whichever of its symmetric forms they are reached from.
+    # The turn is mixed in too: the same board at another turn is another
+    # node (its outcome can differ, as the game ends at MAX_TURNS).
+    def key(self, symmetry_plies=0, frame=IDENTITY):
+        board = self._board
+        turn_key = ZOBRIST_TURNS[board.turn_count]
+        if board.turn_count < symmetry_plies:
+            key, transform = board.canonical()
+            return key ^ turn_key, transform
+        if frame != IDENTITY:
+            return board.transformed_zobrist(frame) ^ turn_key, frame
+        return board.zobrist ^ turn_key, IDENTITY
+
+    # the children as a {child key: action} dict, found by trying each action
+    # on this state (nothing is copied). frame is the transform into the
+    # frame of this state's key (as returned by `key`, which is called for it
+    # if it's None). The actions are in that frame, so symmetric children
+    # are only listed once, and the children are keyed in it.
+    def find_children(self, symmetry_plies=0, frame=None):
+        children = {}
+        self._action_list = get_legal_action_ids(self)
+        if frame is None:
+            _, frame = self.key(symmetry_plies)
         for action in self._action_list:
-            new_state = copy.deepcopy(self)
-            new_state.update(action)
-            new_state._action = action
-            new_state.depth = self._depth + 1
-            children.append(new_state)
+            self._board.push(action)
+            children[self.key(symmetry_plies, frame)[0]] = \
+                transform_action(action, frame)
+            self._board.pop()
         return children
 
-    def rollout(self):
-        current_state = self
+    # play the game to the end randomly, then take all the actions back, and
+    # return the result for the player to move: 1 for a win, 0.5 for a draw
+    # and 0 for a loss. With playouts > 1, play that many games (all in one
+    # batch when numpy is available) and return the mean result.
+    def rollout(self, playouts=1):
         color = self.color
-        if current_state is not None:
-            simulate_state = copy.deepcopy(current_state)
-            while not simulate_state.is_terminal():
-                simulate_state.random_action()
-            if simulate_state.get_winner() == color:
-                return 1
-            elif simulate_state.get_winner() is None:
-                return 0
-            else:
-                return 0
-        return 0
+        if playouts > 1:
+            engine = batch_engine()
+            if engine is None:
+                return sum(self.rollout() for _ in range(playouts)) / playouts
+            batch, rng = engine
+            winners = batch.BatchBoard.from_board(self._board, playouts) \
+                .play_random(rng)
+            return float((winners == color.value).mean()
+                         + 0.5 * (winners == batch.NO_PLAYER).mean())
+        if ROLLOUT_ENGINE == "fast":
+            winner = playout(self._board, random, ROLLOUT_CUTOFF)
+        else:
+            winner = self._board.rollout(
+                lambda board: board.random_legal_action(random))
+        if winner == color:
+            return 1
+        elif winner is None:
+            return 0.5
+        else:
+            return 0
 
     def print_board(self):
         print(self._board.render())
@@ -65,6 +118,26 @@ class state:
             self._game_over = True
             self._winner = self._board.winner_color
 
+    # search API: walk the board up and down the game tree in place, instead
+    # of copying the state. These don't record the last action.
+    def push(self, action):
+        if CHECK_PUSHES and not self._board.is_legal(action):
+            raise IllegalActionException(
+                f"illegal action id {action} pushed", self.color)
+        self._board.push(action)
+        self._sync()
+        self._depth += 1
+
+    def pop(self):
+        self._board.pop()
+        self._sync()
+        self._depth -= 1
+
+    def _sync(self):
+        self.color = self._board.turn_color
+        self._game_over = self._board.game_over
+        self._winner = self._board.winner_color
+
     # random action
     def random_action(self):
         """
@@ -72,7 +145,7 @@ class state:
         """
         # get the color
         # get one random available action
-        action = random.choice(get_legal_actions(self))
+        action = self._board.random_legal_action(random)
         # update the board
         self.update(action)
 
@@ -91,26 +164,33 @@ class state:
     def get_action(self):
         if self._action is None:
             return None
+        # actions played by the search are integer action ids
+        if isinstance(self._action, int):
+            return decode_action(self._action)
         return self._action
 
     # set up action list
     # get action list
 
     def __deepcopy__(self, memodict={}):
-        new_state = state()
-        new_state._board = copy.deepcopy(self._board)
+        # bypass __init__, and copy the board's cells only (not its history)
+        new_state = state.__new__(state)
+        new_state._board = self._board.copy()
         new_state.color = self.color
         new_state._winner = self._winner
         new_state._action = self._action
+        new_state._game_over = self._game_over
+        new_state._action_list = self._action_list
+        new_state._depth = self._depth
         return new_state
 
     # let the node compareable
     def __eq__(self, other):
         return self._board == other._board
 
-    # let node hashable
+    # let node hashable (the board's Zobrist key already covers the color)
     def __hash__(self):
-        return hash((self._board, self.color))
+        return self._board.zobrist
 
 
 
@@ -118,37 +198,34 @@ def get_legal_actions(CurrState: state) -> List[Action]:
     """
     This function is used to get the legal actions.
     legal actions: all the positions player can spawn on. All the directions player can spread to.
-    have not finished yet.
+    The board keeps its empty and occupied cells up to date, so nothing is
+    rescanned (the action instances are shared, nothing is allocated).
+    """
+    board = CurrState.get_board()
+    return [ACTIONS[action] for action in board.legal_actions()]
+
+
+def get_legal_action_ids(CurrState: state) -> List[int]:
+    """
+    This function is used to get the legal actions as integer action ids
+    (see referee.game.actions), which is what the search tree stores. The
+    board applies ids directly, without validating them.
+    """
+    return list(CurrState.get_board().legal_actions())
+
+
+def batch_engine():
+    """
+    This function is used to get what batched rollouts need: the
+    referee.game.batch module and a numpy random generator, as a pair, or
+    None when numpy isn't installed. numpy is imported on the first call.
     """
-    # get the board
-    CurrBoard = CurrState.get_board()
-    # get the color
-    color = CurrBoard.turn_color
-    # get the positions
-    positions = CurrBoard._state
-    # get the occupied positions
-    occupied_positions = get_same_color_list(positions, color)
-    # get the legal actions
-    legal_actions = []
-    # for Spread actions
-    for pos in occupied_positions:
-        # all the directions around the position
-        directions = [HexDir.Down, HexDir.DownLeft, HexDir.DownRight, HexDir.Up, HexDir.UpLeft, HexDir.UpRight]
-        for direction in directions:
-            legal_actions.append(SpreadAction(pos[0], direction))
-    # for Spawn actions
-    # all the position on the board that is not occupied when the total power is less than 49
-    if CurrBoard._total_power < 49:
-        for x in range(SIZE):
-            for y in range(SIZE):
-                if positions[HexPos(x, y)].player is None:
-                    legal_actions.append(SpawnAction(HexPos(x, y)))
-    return legal_actions
-
-
-def get_same_color_list(position_list: dict[HexPos, CellState], color) -> list[(HexPos, CellState)]:
-    same_color_list = []
-    for pos in position_list:
-        if position_list[pos].player == color:
-            same_color_list.append((pos, position_list[pos]))
-    return same_color_list
+    global _batch_engine
+    if _batch_engine is None:
+        try:
+            import numpy as np
+            from referee.game import batch
+            _batch_engine = batch, np.random.default_rng()
+        except ImportError:
+            _batch_engine = ()
+    return _batch_engine or None
@@ -1,105 +1,281 @@
 import random
-import math
-from collections import defaultdict
+import itertools
+from referee.game.symmetry import IDENTITY, INVERSE_TRANSFORMS, \
+    transform_action
+from referee.game.ucb import ucb_select
+from referee.game.clock import out_of_time
+from .transposition import TranspositionTable
+from . import game
+
+
+# The tree is keyed by the positions' Zobrist keys rather than by states: the
+# search walks the one state it is given up and down the tree (pushing actions
+# on the way down, and popping them again at the end of every iteration), so
+# no state is ever copied. The nodes' statistics and children are kept in a
+# transposition table of fixed capacity (see transposition.py), sized to the
+# referee's space limit, so the tree can't outgrow it over a long game.
+#
+# In the opening (the first symmetry_plies turns) the keys are canonical (see
+# `state.key`), so symmetric positions share one node and its statistics. The
+# actions stored with a node are then in the frame of its canonical form, and
+# are mapped back onto the actual position before being played. Below the
+# last canonical node, the search keeps that node's transform: the positions
+# are keyed, and their actions stored, in its frame.
+#
+# A node's reward is from the point of view of the player who moved into it,
+# so its parent (where the other player is to move) picks the child with the
+# best one.
+#
+# MCTS-Solver: nodes whose outcome is known are marked as proven, with the
+# value of the game for the player who moved into them. A terminal node is
+# proven by its winner, and a node is proven as soon as one of its children
+# is a proven win (the player to move there takes it, so it's a loss), or all
+# of them are proven (its value is then the opposite of the best of theirs).
+# Proofs are backed up the path after each iteration. A proven node is never
+# simulated again: it is scored by its value when it is reached, selection
+# leaves out children proven to lose, and the search stops once the root is
+# solved. (A node's key includes the turn, see `state.key`, so the proofs
+# which depend on MAX_TURNS only hold for the turn they were found at.)
+PROVEN_LOSS = 1
+PROVEN_DRAW = 2
+PROVEN_WIN = 3
+# the value of a proven node for the other player
+OPPONENT_PROOF = {PROVEN_LOSS: PROVEN_WIN, PROVEN_DRAW: PROVEN_DRAW,
+                  PROVEN_WIN: PROVEN_LOSS}
+# the reward a proven node is scored by
+PROOF_REWARD = {PROVEN_LOSS: 0, PROVEN_DRAW: 0.5, PROVEN_WIN: 1}
 
 
 class MCTS:
-    def __init__(self, exploration_weight=1.41):
-        self.score = defaultdict(int)  # total reward of each node
-        self.visit = defaultdict(int)  # total visit count for each node
-        self.children = dict()  # children of each node
+    def __init__(self, exploration_weight=1.41, symmetry_plies=10, playouts=1,
+                 space_limit=None):
+        # total reward, visit count and children of each node
+        self.table = TranspositionTable.for_space_limit(space_limit)
         self.exploration_weight = exploration_weight
+        self.symmetry_plies = symmetry_plies
+        # random games per simulation (simulated together when numpy is
+        # available); the reward is their mean result (see
+        # state.rollout)
+        self.playouts = playouts
+
+    # the key of the node for a state, and the transform into its frame,
+    # given the transform into its parent's (see `state.key`)
+    def key(self, state, frame=IDENTITY):
+        return state.key(self.symmetry_plies, frame)
 
-    # choose the best action
-    def choose(self, node):
-        "Choose the best successor of node. (Choose a move in the game)"
-        if node.is_terminal():
-            raise RuntimeError(f"choose called on terminal node {node}")
+    # choose the best action (as an action id)
+    def choose(self, state):
+        "Choose the best successor of state. (Choose a move in the game)"
+        if state.is_terminal():
+            raise RuntimeError(f"choose called on terminal node {state}")
 
-        if node not in self.children:
-            return node.find_random_child()
+        node, transform = self.key(state)
+        children = self.table.children(node)
+        if children is None:
+            return random.choice(game.get_legal_action_ids(state))
 
         def score(n):
-            if self.score[n] == 0:
-                return float("-inf")  # avoid unseen moves
-            return self.score[n] / self.visit[n]  # average reward
+            proof = self.table.proof(n)
+            if proof == PROVEN_WIN:
+                return float("inf")  # a forced win
+            if proof == PROVEN_LOSS or self.table.score(n) == 0:
+                return float("-inf")  # avoid unseen (and lost) moves
+            return self.table.score(n) / self.table.visit(n)  # average reward
 
-        return max(self.children[node], key=score)
+        return transform_action(
+            children[max(children, key=score)], INVERSE_TRANSFORMS[transform])
 
-    def do_rollout(self, node):
+    # whether the outcome of the game from state is proven
+    def solved(self, state):
+        return self.table.proof(self.key(state)[0]) != 0
+
+    # run iterMax iterations from state, or given a deadline (see
+    # referee.game.clock), as many as there is time for, stopping early if
+    # state is solved. Returns the number of iterations run.
+    def search(self, state, iterMax, deadline=None):
+        done = 0
+        iterations = range(iterMax) if deadline is None else itertools.count()
+        for i in iterations:
+            if out_of_time(deadline, i) or self.solved(state):
+                break
+            self.do_rollout(state)
+            done += 1
+        return done
+
+    # the {action id: (visits, total reward)} of the searched children of
+    # state, with the actions in the frame of the actual state
+    def root_stats(self, state):
+        node, transform = self.key(state)
+        children = self.table.children(node)
+        if children is None:
+            return {}
+        inverse = INVERSE_TRANSFORMS[transform]
+        return {
+            transform_action(action, inverse):
+                (self.table.visit(child), self.table.score(child))
+            for child, action in children.items()
+            if self.table.visit(child)
+        }
+
+    def do_rollout(self, state):
         "Make the tree one layer better. (Train for one iteration.)"
-        path = self._select(node)  # *
-        leaf = path[-1]
-        self._expand(leaf)  # *
-        reward = self._simulate(leaf)  # *
-        self._backpropagate(path, reward)
-
-    def _select(self, node):
-        "Find an unexplored descendent of `node`"
         path = []
+        try:
+            transform = self._select(state, path)  # *
+            leaf = path[-1]
+            if state.is_terminal():
+                self._prove_terminal(leaf, state)
+            proof = self.table.proof(leaf)
+            if proof:
+                reward = PROOF_REWARD[proof]
+            else:
+                self._expand(leaf, state, transform)  # *
+                # (the simulation's reward is for the player to move)
+                reward = 1 - self._simulate(state)  # *
+            self._backpropagate(path, reward)
+            if proof:
+                self._prove_ancestors(path)
+        finally:
+            # back to the root position
+            for _ in range(len(path) - 1):
+                state.pop()
+
+    def _select(self, state, path):
+        "Find an unexplored descendent of `state`, moving `state` to it"
+        # (returns the transform into the frame of the descendent's node)
+        node, transform = self.key(state)
         while True:
             path.append(node)
-            if node not in self.children or not self.children[node]:  # 如果当前节点不在children字典中，或者当前节点的子节点为空（没有子节点）
+            if self.table.proof(node):
+                # solved: nothing left to find out below it
+                return transform
+            children = self.table.children(node)
+            if not children:  # 如果当前节点不在children字典中，或者当前节点的子节点为空（没有子节点）
                 print('node not in children or not self.children[node]')
                 # node is either unexplored or terminal
-                return path
-            unexplored = self.children[node] - self.children.keys()  # 得到所有当前子节点中尚未加入children的（即未被探索的）集合
+                return transform
+            # (children proven to lose are never chosen)
+            open_children = [n for n in children
+                             if self.table.proof(n) != PROVEN_LOSS]
+            if not open_children:
+                # all lost, but the proof hasn't been backed up this far
+                # (e.g. the table had lost it)
+                self.table.set_proof(node, PROVEN_WIN)
+                return transform
+            unexplored = [n for n in open_children if not self.table.expanded(n) and not self.table.proof(n)]  # 得到所有当前子节点中尚未加入children的（即未被探索的）集合
             if unexplored:
-                n = unexplored.pop()  # 随机选取一个未被探索的子节点
+                n = random.choice(unexplored)  # 随机选取一个未被探索的子节点
+                state.push(self._action(children, n, transform))
                 path.append(n)
-                return path
-            node = self._uct_select(node)  # descend a layer deeper
+                return self._frame(state, n, transform)
+            child = self._uct_select(node, open_children)  # descend a layer deeper
+            state.push(self._action(children, child, transform))
+            # (the child's key is the one its parent has for it)
+            node, transform = child, self._frame(state, child, transform)
+
+    def _action(self, children, child, transform):
+        "The action to `child`, in the frame of the actual state"
+        return transform_action(children[child], INVERSE_TRANSFORMS[transform])
 
-    def _expand(self, node):
-        "Update the `children` dict with the children of `node`"
-        if node in self.children:
+    def _frame(self, state, node, frame):
+        "The transform into the frame of `node`, the child `state` was moved to"
+        # (frame is the transform into its parent's frame)
+        if game.CHECK_PUSHES:
+            assert self.key(state, frame)[0] == node, "child key mismatch"
+        if state.get_board().turn_count < self.symmetry_plies:
+            return self.key(state)[1]
+        return frame
+
+    def _expand(self, node, state, transform):
+        "Add the children of `node` to the table (`transform` into its frame)"
+        if self.table.expanded(node):
             return  # already expanded
-        self.children[node] = node.find_children()  # 加入children字典， 同时在value总加入它的所有的子节点 *
+        self.table.set_children(node, state.find_children(self.symmetry_plies, transform))  # 加入children字典， 同时在value总加入它的所有的子节点 *
+
+    def _prove_terminal(self, node, state):
+        "Mark the terminal `node` as proven, by the winner of `state`"
+        winner = state.get_winner()
+        if winner is None:
+            proof = PROVEN_DRAW
+        elif winner == state.color:  # the player to move
+            proof = PROVEN_LOSS
+        else:
+            proof = PROVEN_WIN
+        self.table.set_proof(node, proof)
+
+    def _prove_ancestors(self, path):
+        "Back the proof of the leaf up the path, as far as it goes"
+        for node in reversed(path[:-1]):
+            if self.table.proof(node):
+                return
+            proof = self._proof(node)
+            if not proof:
+                return
+            self.table.set_proof(node, proof)
+
+    def _proof(self, node):
+        "The proven value of `node` from its children's, or 0 if not proven"
+        children = self.table.children(node)
+        if not children:
+            return 0
+        best = 0
+        for child in children:
+            proof = self.table.proof(child)
+            if proof == PROVEN_WIN:
+                return PROVEN_LOSS
+            if not proof:
+                best = None  # (still looking for a win)
+            elif best is not None:
+                best = max(best, proof)
+        return 0 if best is None else OPPONENT_PROOF[best]
 
-    def _simulate(self, node):  # 返回本次模拟对于当前玩家来说赢了还是输了
-        "Returns the reward for a random simulation (to completion) of `node`"
-        return node.rollout()
+    def _simulate(self, state):  # 返回本次模拟对于当前玩家来说赢了还是输了
+        "Returns the reward for a random simulation (to completion) of `state`"
+        return state.rollout(self.playouts)
 
     def _backpropagate(self, path, reward):
         "Send the reward back up to the ancestors of the leaf"
         for node in reversed(path):
-            self.visit[node] += 1
-            self.score[node] += reward
+            self.table.update(node, reward)
             reward = 1 - reward  # 1 for me is 0 for my enemy, and vice versa
 
-    def _uct_select(self, node):
+    def _uct_select(self, node, children):
         "Select a child of node, balancing exploration & exploitation"
 
-        # All children of node should already be expanded:
-        assert all(n in self.children for n in self.children[node])
+        # All children of node should already be expanded (or proven):
+        assert all(self.table.expanded(n) or self.table.proof(n)
+                   for n in children)
 
-        log_N_vertex = math.log(self.visit[node])
-
-        def uct(n):
-            "Upper confidence bound for trees"
-            return self.score[n] / self.visit[n] + self.exploration_weight * math.sqrt(
-                log_N_vertex / self.visit[n]
-            )
-
-        return max(self.children[node], key=uct)  # 从当前节点的所有子节点中选取一个uct值最大的节点
+        table = self.table
+        keys = list(children)
+        slots = [table.slots[key] for key in keys]
+        return keys[ucb_select(slots, table.visits, table.scores,
+                               table.visit(node), self.exploration_weight)]
 
     def print_tree(self):
-        for children in self.children:
-            print('children: ', children)
-            print('score: ', self.score[children])
-            print('visit: ', self.visit[children])
+        for key, visit, score in self.table.items():
+            print('children: ', key)
+            print('score: ', score)
+            print('visit: ', visit)
             print('---------------------')
 
-    # delete the key that will never use
-    def remove_items_before_key(self, target_key):
-        keys_to_remove = []
-        for key in self.children.keys():
-            if key == target_key:
-                break
-            keys_to_remove.append(key)
-        print('keys_to_remove: ', keys_to_remove)
-        for key in keys_to_remove:
-            del self.children[key]
+    # start a new turn: the nodes of earlier turns will mostly never be used
+    # again, so they are the first to be replaced when the table is full
+    def new_turn(self):
+        self.table.new_generation()
+
+    # start a new turn at the position of state, carrying over the subtree
+    # below it: its nodes are kept in the current generation, and only the
+    # nodes which can no longer be reached are given up for replacement
+    def advance(self, state):
+        self.new_turn()
+        stack = [self.key(state)[0]]
+        while stack:
+            node = stack.pop()
+            if self.table.touch(node):
+                children = self.table.children(node)
+                if children:
+                    stack.extend(children)
 
 
 """
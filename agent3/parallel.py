@@ -0,0 +1,137 @@
+import multiprocessing
+import random
+import sys
+import time
+
+from . import game
+from .monte_carlo_tree_search import MCTS
+
+# Root-parallel search: W worker processes each run an independent search
+# from the current position (with their own random seeds and their own
+# trees), and the statistics of the root's children are summed over all the
+# workers before the move is chosen, as by `MCTS.choose`, by average reward.
+#
+# The referee's timer only counts the CPU time of the agent's own process,
+# not that of its workers. To keep the accounting honest, every worker
+# reports the CPU time it used, the total is kept in `worker_time`, and the
+# agent takes it off the time remaining before budgeting its next move. A
+# move's budget is shared out between the workers, so a parallel search
+# uses the same CPU time as a serial one, in a fraction of the wall time.
+#
+# So under the referee's CPU time accounting, this mode adds no search: W
+# workers run at most as many iterations as one search would, split over W
+# smaller trees (and fewer, for the cost of starting each search and sending
+# its results back). It only shortens the wall time of a move, given W free
+# cores. That is why it isn't offered by the other MCTS agents, agent and
+# agent2, and why it is off by default here (see program.WORKERS).
+#
+# The workers are started with "spawn" rather than forked: the referee
+# replaces the agent process's stdin with an object forked workers can't
+# close, and a fresh process doesn't inherit the agent's tree either. Each
+# worker is a plain process fed through a pipe, not a `multiprocessing.Pool`,
+# whose helper threads would count against the agent's space limit (which
+# the referee measures as virtual memory).
+
+
+# the worker's side: one search from the position of board. Returns the root
+# children's statistics, the number of iterations and the CPU time used.
+def _search(board, seed, iterMax, budget, options):
+    start = time.process_time()
+    random.seed(seed)
+    state = game.state()
+    state._board = board
+    state._sync()
+    tree = MCTS(**options)
+    deadline = None if budget is None else start + budget
+    iterations = tree.search(state, iterMax, deadline)
+    return tree.root_stats(state), iterations, time.process_time() - start
+
+
+# a worker process: run the searches sent down the pipe, until sent None (or
+# the agent's process has gone)
+def _worker(connection):
+    # stdout is the referee's channel to the agent: print to stderr instead
+    # (as the referee makes the agent itself do)
+    sys.stdout = sys.stderr
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        connection.send(_search(*job))
+
+
+class RootParallel:
+    # options are passed on to the workers' MCTS; the space limit (in MB) is
+    # shared out between them. With debug, every search prints its stats.
+    def __init__(self, workers, space_limit=None, debug=False, **options):
+        self.workers = workers
+        self.debug = debug
+        if space_limit:
+            options["space_limit"] = space_limit / workers
+        self.options = options
+        context = multiprocessing.get_context("spawn")
+        self.connections = []
+        self.processes = []
+        for _ in range(workers):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(
+                target=_worker, args=(worker_connection,), daemon=True)
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+        self.worker_time = 0.0  # total CPU time used by the workers
+        self.iterations = 0  # total iterations run by the workers
+
+    # search from state on all the workers, and choose the best action (as
+    # an action id). Without a deadline, iterMax iterations are shared out
+    # between the workers; with one, the time until it is.
+    def choose(self, state, iterMax, deadline=None):
+        if deadline is None:
+            budget = None
+        else:
+            budget = max(0.0, deadline - time.process_time()) / self.workers
+        board = state.get_board().copy()
+        start = time.perf_counter()
+        for connection in self.connections:
+            connection.send((board, random.getrandbits(64),
+                             max(1, iterMax // self.workers), budget,
+                             self.options))
+
+        merged = {}
+        iterations = 0
+        worker_time = 0.0
+        for connection in self.connections:
+            stats, done, cpu = connection.recv()
+            iterations += done
+            worker_time += cpu
+            for action, (visit, score) in stats.items():
+                total = merged.get(action, (0, 0))
+                merged[action] = (total[0] + visit, total[1] + score)
+        elapsed = time.perf_counter() - start
+        self.iterations += iterations
+        self.worker_time += worker_time
+        if self.debug:
+            print(f"root parallel: {self.workers} workers, {iterations} "
+                  f"iterations in {elapsed:.3f}s "
+                  f"({iterations / max(elapsed, 1e-9):.0f}/s), worker CPU "
+                  f"time {worker_time:.3f}s (total {self.worker_time:.3f}s)")
+
+        if not merged:
+            return random.choice(game.get_legal_action_ids(state))
+        return max(merged, key=lambda a: merged[a][1] / merged[a][0])
+
+    # stop the workers (more calls do nothing)
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass  # the worker has gone already
+            connection.close()
+        for process in self.processes:
+            process.join(1)
+        self.connections = []
+        self.processes = []
@@ -0,0 +1,66 @@
+import ctypes
+import threading
+
+# Pondering: once our move is played, keep searching from the new position
+# in a background thread while the opponent thinks, and stop again as soon as
+# the referee calls the agent. The referee only times the agent's own calls
+# (and the agent is otherwise blocked waiting for the next one), so this work
+# costs nothing on our clock.
+#
+# The tree is a transposition table keyed by position, so nothing needs to be
+# moved about when the opponent's move comes in: the subtree below the move
+# that was played is already in the table, and `MCTS.advance` keeps it (and
+# lets the rest go) at the start of the next search.
+#
+# The referee's space limit is on the peak virtual memory of the process, and
+# a new thread normally reserves a lot of it: glibc gives every thread its
+# own malloc arena (a transient 128MB reservation), on top of its stack. So
+# malloc is told to keep to one arena (where it can be), and the thread gets
+# a smaller stack (the search doesn't recurse).
+
+# glibc's mallopt parameter for the maximum number of arenas
+M_ARENA_MAX = -8
+# the pondering thread's stack size, in bytes
+STACK_SIZE = 1 << 22
+
+
+def _single_malloc_arena():
+    try:
+        ctypes.CDLL(None).mallopt(M_ARENA_MAX, 1)
+    except (OSError, AttributeError):
+        pass  # not glibc: nothing to do
+
+
+class Ponderer:
+    def __init__(self, tree):
+        self.tree = tree
+        self.iterations = 0  # iterations run while pondering, in total
+        self._thread = None
+        self._stop = threading.Event()
+        _single_malloc_arena()
+
+    # start pondering from the position of state. The state is the search's
+    # until `stop` is called, and must not be touched until then.
+    def start(self, state):
+        self.stop()
+        self._stop.clear()
+        stack_size = threading.stack_size(STACK_SIZE)
+        try:
+            self._thread = threading.Thread(
+                target=self._run, args=(state,), daemon=True)
+            self._thread.start()
+        finally:
+            threading.stack_size(stack_size)
+
+    def _run(self, state):
+        while not self._stop.is_set() and not state.is_terminal() \
+                and not self.tree.solved(state):
+            self.tree.do_rollout(state)
+            self.iterations += 1
+
+    # stop pondering (once the iteration under way is finished)
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
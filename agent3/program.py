@@ -1,12 +1,27 @@
 # COMP30024 Artificial Intelligence, Semester 1 2023
 # Project Part B: Game Playing Agent
 
+import atexit
+
 from referee.game import \
     PlayerColor, Action, SpawnAction, SpreadAction
+from referee.game.actions import decode_action
+from referee.game.clock import move_deadline
 
 from . import game
 from .monte_carlo_tree_search import MCTS
+from .parallel import RootParallel
+from .ponder import Ponderer
 
+# the number of worker processes for a root-parallel search (see
+# parallel.py), or 1 to search in the agent's own process
+WORKERS = 1
+# whether to keep searching while the opponent thinks (see ponder.py; only
+# without workers)
+PONDER = False
+# whether to print search diagnostics, such as how far pondering got or
+# the root-parallel search stats
+DEBUG = False
 
 
 # This is the entry point for your game playing agent. Currently the agent
@@ -22,7 +37,18 @@ class Agent:
         """
         self._color = color
         self._state = game.state()
-        self.tree = MCTS()
+        self.parallel = None
+        if WORKERS > 1:
+            self.parallel = RootParallel(
+                WORKERS, space_limit=referee.get("space_limit"), debug=DEBUG)
+            # the workers are stopped when the game ends (see turn), or when
+            # the agent's process exits before that
+            atexit.register(self.parallel.close)
+        # the tree's table is sized to fit in the referee's space limit
+        self.tree = MCTS(space_limit=referee.get("space_limit"))
+        self.ponderer = None
+        if PONDER and self.parallel is None:
+            self.ponderer = Ponderer(self.tree)
         match color:
             case PlayerColor.RED:
                 print("Testing: I am playing as red")
@@ -33,27 +59,46 @@ class Agent:
         """
         Return the next action to take.
         """
+        if self.ponderer is not None:
+            self.ponderer.stop()
+            if DEBUG:
+                root = self.tree.key(self._state)[0]
+                print(f"pondering: {self.ponderer.iterations} iterations "
+                      f"in total, {self.tree.table.visit(root)} visits to "
+                      f"start this search with")
+        # search for as long as the time left allows, if it is limited. The
+        # referee doesn't see the workers' CPU time, so take it off here.
+        time_remaining = referee.get("time_remaining")
+        if self.parallel is not None and time_remaining is not None:
+            time_remaining -= self.parallel.worker_time
+        deadline = move_deadline(self._state.get_board(), time_remaining)
+        if self.parallel is not None:
+            action = self.parallel.choose(self._state, 10000, deadline)
+            return decode_action(action)
         match self._color:
             case PlayerColor.RED:
                 # use the MCTS to get the action
-                self.tree.remove_items_before_key(self._state)
-                print(len(self.tree.children),'\n\n\n\n\n\n\n\n\n')
-                for i in range(100):
-                    self.tree.do_rollout(self._state)
-                return_node = self.tree.choose(self._state)
-                self.tree.print_tree()
-                return return_node.get_action()
+                self.tree.advance(self._state)
+                print(len(self.tree.table),'\n\n\n\n\n\n\n\n\n')
+                self.tree.search(self._state, 100, deadline)
+                action = self.tree.choose(self._state)
+                # (printing the whole tree takes too long for a timed game)
+                if deadline is None:
+                    self.tree.print_tree()
+                return decode_action(action)
             case PlayerColor.BLUE:
                 # use the MCTS to get the action
-                for i in range(10000):
-                    self.tree.do_rollout(self._state)
-                return_node = self.tree.choose(self._state)
-                return return_node.get_action()
+                self.tree.advance(self._state)
+                self.tree.search(self._state, 10000, deadline)
+                action = self.tree.choose(self._state)
+                return decode_action(action)
 
     def turn(self, color: PlayerColor, action: Action, **referee: dict):
         """
         Update the agent with the last player's action.
         """
+        if self.ponderer is not None:
+            self.ponderer.stop()
         match action:
             case SpawnAction(cell):
                 # update the game
@@ -64,3 +109,12 @@ class Agent:
                 self._state.update(action)
                 print(f"Testing: {color} SPREAD from {cell}, {direction}")
                 pass
+
+        if self.parallel is not None and self._state.is_terminal():
+            self.parallel.close()
+
+        # think on the opponent's time, from the position after our move
+        if self.ponderer is not None and color == self._color \
+                and not self._state.is_terminal():
+            self.tree.advance(self._state)
+            self.ponderer.start(self._state)
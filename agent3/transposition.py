@@ -0,0 +1,181 @@
+from array import array
+import random
+
+# A transposition table with a fixed capacity, for the MCTS tree. Instead of
+# one dict entry (and one dict of children) per node, which grows without a
+# bound over a 343 turn game, every node is a slot in a few preallocated
+# arrays: its 64-bit position key, visit count, total reward, the turn it was
+# last touched in (its generation), where its children are, and its proven
+# value if it has been solved (see MCTS).
+#
+# The children of all nodes share one arena of (child key, action) pairs,
+# used as a ring buffer: a node only records the position of its first child
+# and how many there are. Once the arena has wrapped around past a node's
+# children, the node simply counts as unexpanded again, and is re-expanded
+# the next time the search reaches it.
+#
+# A dict maps the keys to their slots. It never holds more than `capacity`
+# entries, so the memory used is set when the table is made, and stays flat.
+# When the table is full, a new node replaces the least valuable of a few
+# sampled slots: entries from an earlier generation (turn) go first, then the
+# ones with the fewest visits.
+
+# bytes per slot: the arrays, plus the dict entry and the key object
+SLOT_BYTES = 8 + 8 + 8 + 8 + 2 + 2 + 1 + 120
+# bytes per arena entry (child key and action id)
+ARENA_BYTES = 8 + 2
+# arena entries per slot (about half the branching factor of the midgame)
+ARENA_PER_SLOT = 64
+# the share of the referee's space limit the table may use (the limit is on
+# the peak virtual memory of the whole process, imports included)
+SPACE_SHARE = 0.25
+# the capacity when there is no space limit
+DEFAULT_CAPACITY = 1 << 15
+# the number of slots looked at to choose one to replace
+REPLACE_SAMPLES = 4
+
+
+class TranspositionTable:
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.slots = {}  # key -> slot
+        # (made by repetition, so no temporary copy adds to the peak memory)
+        self.keys = array('Q', [0]) * capacity
+        self.visits = array('q', [0]) * capacity
+        self.scores = array('d', [0.0]) * capacity
+        self.child_starts = array('q', [0]) * capacity
+        self.child_counts = array('H', [0]) * capacity
+        self.generations = array('H', [0]) * capacity
+        self.proofs = array('b', [0]) * capacity
+        self.generation = 0
+
+        self.arena_capacity = capacity * ARENA_PER_SLOT
+        self.arena_keys = array('Q', [0]) * self.arena_capacity
+        self.arena_actions = array('H', [0]) * self.arena_capacity
+        self.arena_written = 0  # total entries ever written
+
+    # a table which fits in the given space limit (in MB, as the referee
+    # passes it), or a default sized one when there is no limit (None or 0)
+    @classmethod
+    def for_space_limit(cls, space_limit=None):
+        if not space_limit:
+            return cls()
+        budget = space_limit * SPACE_SHARE * 1024 * 1024
+        slot_bytes = SLOT_BYTES + ARENA_PER_SLOT * ARENA_BYTES
+        return cls(max(1024, int(budget // slot_bytes)))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, key):
+        return key in self.slots
+
+    # start a new generation (e.g. a new turn): nodes from earlier ones are
+    # the first to be replaced
+    def new_generation(self):
+        self.generation = (self.generation + 1) & 0xFFFF
+
+    # the slot of a key, adding the key (with no visits or children) if it is
+    # not in the table yet
+    def slot(self, key):
+        slot = self.slots.get(key)
+        if slot is not None:
+            return slot
+        if len(self.slots) < self.capacity:
+            slot = len(self.slots)
+        else:
+            slot = self._victim()
+            del self.slots[self.keys[slot]]
+        self.slots[key] = slot
+        self.keys[slot] = key
+        self.visits[slot] = 0
+        self.scores[slot] = 0.0
+        self.child_counts[slot] = 0
+        self.generations[slot] = self.generation
+        self.proofs[slot] = 0
+        return slot
+
+    def _victim(self):
+        "The least valuable of a few randomly sampled slots"
+        generation, generations, visits = \
+            self.generation, self.generations, self.visits
+        best, best_value = 0, None
+        for _ in range(REPLACE_SAMPLES):
+            slot = random.randrange(self.capacity)
+            value = (generations[slot] == generation, visits[slot])
+            if best_value is None or value < best_value:
+                best, best_value = slot, value
+        return best
+
+    def visit(self, key):
+        slot = self.slots.get(key)
+        return 0 if slot is None else self.visits[slot]
+
+    def score(self, key):
+        slot = self.slots.get(key)
+        return 0 if slot is None else self.scores[slot]
+
+    # the proven value of a key, or 0 if it hasn't been solved
+    def proof(self, key):
+        slot = self.slots.get(key)
+        return 0 if slot is None else self.proofs[slot]
+
+    def set_proof(self, key, value):
+        self.proofs[self.slot(key)] = value
+
+    # mark a key as used in the current generation. Returns whether it was
+    # in the table, and not marked already.
+    def touch(self, key):
+        slot = self.slots.get(key)
+        if slot is None or self.generations[slot] == self.generation:
+            return False
+        self.generations[slot] = self.generation
+        return True
+
+    # add one visit with the given reward
+    def update(self, key, reward):
+        slot = self.slot(key)
+        self.visits[slot] += 1
+        self.scores[slot] += reward
+        self.generations[slot] = self.generation
+
+    # whether a key's children are in the table
+    def expanded(self, key):
+        slot = self.slots.get(key)
+        return slot is not None and self.child_counts[slot] > 0 \
+            and self.arena_written - self.child_starts[slot] \
+            <= self.arena_capacity
+
+    # the {child key: action} dict of a key, or None if it is not expanded
+    def children(self, key):
+        if not self.expanded(key):
+            return None
+        slot = self.slots[key]
+        start = self.child_starts[slot] % self.arena_capacity
+        end = start + self.child_counts[slot]
+        if end <= self.arena_capacity:
+            return dict(zip(
+                self.arena_keys[start:end], self.arena_actions[start:end]))
+        end -= self.arena_capacity
+        return dict(zip(
+            self.arena_keys[start:] + self.arena_keys[:end],
+            self.arena_actions[start:] + self.arena_actions[:end]))
+
+    # store the children of a key, from a {child key: action} dict
+    def set_children(self, key, children):
+        slot = self.slot(key)
+        written = self.arena_written
+        start = written % self.arena_capacity
+        for i, (child, action) in enumerate(children.items(), start):
+            if i >= self.arena_capacity:
+                i -= self.arena_capacity
+            self.arena_keys[i] = child
+            self.arena_actions[i] = action
+        self.child_starts[slot] = written
+        self.child_counts[slot] = len(children)
+        self.arena_written = written + len(children)
+
+    # the (key, visits, score) of every node
+    def items(self):
+        for key, slot in self.slots.items():
+            yield key, self.visits[slot], self.scores[slot]
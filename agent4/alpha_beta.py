@@ -0,0 +1,225 @@
+import time
+from array import array
+
+from referee.game.actions import ACTION_COUNT
+
+from .game import MAX_DEPTH, WIN_SCORE, evaluate, terminal_score
+from .transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+# Negamax alpha-beta search with iterative deepening: the position is
+# searched to depth 1, 2, 3, ... until the time for the move runs out, and
+# the best action of the deepest search finished is played. Each iteration
+# starts with an aspiration window around the last one's score, and only
+# widens it (and searches again) if the score falls outside it.
+#
+# The board is walked up and down the tree with push/pop (nothing is
+# copied), and actions are integer action ids throughout. Actions are tried
+# best first: the transposition table's action for the position, then the
+# killer actions (the last two that caused a cutoff at the same ply), then
+# the rest by their history score (how much cutoffs they have caused, at any
+# ply, weighted by the depth left).
+#
+# After the first action, the others are searched with a null window (just
+# to show that they are no better), and again with the full window only if
+# one is (principal variation search). Late actions, past the first
+# LATE_ACTIONS, are also searched a ply shallower at first when there are at
+# least REDUCE_DEPTH plies left (late move reductions), and again at the
+# full depth only if they turn out better.
+
+# the half-width of the aspiration window (in evaluation units)
+ASPIRATION_WINDOW = 8
+# a score past any other
+INFINITY = WIN_SCORE + 1
+# scores beyond this are wins (or losses) in a known number of plies
+WIN_BOUND = WIN_SCORE - 1024
+# the search checks the clock every CLOCK_CHECK_EVERY nodes
+CLOCK_CHECK_EVERY = 1024
+# a deeper search is only started in the first NEW_DEPTH_SHARE of the time
+# for the move (later on, it would hardly ever finish)
+NEW_DEPTH_SHARE = 0.5
+# killer actions kept per ply
+KILLERS = 2
+# late move reductions: the actions past the first LATE_ACTIONS are reduced,
+# with at least REDUCE_DEPTH plies left
+LATE_ACTIONS = 4
+REDUCE_DEPTH = 3
+
+
+class OutOfTime(Exception):
+    pass
+
+
+class AlphaBeta:
+    def __init__(self, space_limit=None):
+        self.table = TranspositionTable.for_space_limit(space_limit)
+        # history scores, by player (PlayerColor value) and action id
+        self.history = [array('i', [0]) * ACTION_COUNT for _ in range(2)]
+        self.killers = [[-1] * KILLERS for _ in range(MAX_DEPTH + 1)]
+        self.deadline = None
+        self.nodes = 0
+        self.depth = 0  # the depth of the last search finished
+        self.score = 0  # its score
+
+    # the best action (as an action id) from the position of board, searching
+    # to max_depth, or as deep as there is time for given a deadline (a
+    # time.process_time() value). The board is left as it was.
+    def search(self, board, max_depth=MAX_DEPTH, deadline=None):
+        self.table.new_search()
+        self.deadline = deadline
+        self.nodes = 0
+        self.depth = 0
+        for killers in self.killers:
+            killers[:] = [-1] * KILLERS
+        # halve the history, so the last searches count for less
+        for history in self.history:
+            for action in range(ACTION_COUNT):
+                history[action] >>= 1
+
+        root_count = board.turn_count
+        if deadline is not None:
+            start = time.process_time()
+            last_start = start + (deadline - start) * NEW_DEPTH_SHARE
+        best_action = next(iter(board.legal_actions()))
+        score = 0
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self._aspiration(board, depth, score)
+            except OutOfTime:
+                # back to the root, and keep the last finished search's action
+                while board.turn_count > root_count:
+                    board.pop()
+                break
+            slot = self.table.find(TranspositionTable.key(board))
+            if slot >= 0 and self.table.actions[slot] >= 0:
+                best_action = self.table.actions[slot]
+            self.depth = depth
+            if abs(score) > WIN_BOUND:
+                break  # the outcome is decided
+            if deadline is not None and time.process_time() >= last_start:
+                break
+        self.score = score
+        return best_action
+
+    def _aspiration(self, board, depth, guess):
+        "Search to `depth` with a window around `guess`, widening it as needed"
+        if depth == 1:
+            return self._negamax(board, depth, -INFINITY, INFINITY, 0)
+        window = ASPIRATION_WINDOW
+        while True:
+            alpha = max(-INFINITY, guess - window)
+            beta = min(INFINITY, guess + window)
+            score = self._negamax(board, depth, alpha, beta, 0)
+            if alpha < score < beta \
+                    or alpha == -INFINITY and beta == INFINITY:
+                return score
+            window *= 4
+            guess = score
+
+    def _negamax(self, board, depth, alpha, beta, ply):
+        "The score of board's position for the player to move, within the window"
+        self.nodes += 1
+        if self.nodes % CLOCK_CHECK_EVERY == 0 and self.deadline is not None \
+                and self.depth > 0 and time.process_time() >= self.deadline:
+            raise OutOfTime()
+
+        if board.game_over:
+            return terminal_score(board, ply)
+        if depth == 0:
+            return evaluate(board)
+
+        table = self.table
+        key = TranspositionTable.key(board)
+        table_action = -1
+        slot = table.find(key)
+        if slot >= 0:
+            table_action = table.actions[slot]
+            if table.depths[slot] >= depth:
+                score = _from_table(table.scores[slot], ply)
+                kind = table.kinds[slot]
+                if kind == EXACT:
+                    return score
+                if kind == LOWER and score > alpha:
+                    alpha = score
+                elif kind == UPPER and score < beta:
+                    beta = score
+                if alpha >= beta:
+                    return score
+
+        alpha_start = alpha
+        history = self.history[board.turn_color.value]
+        killers = self.killers[ply]
+        best_score = -INFINITY
+        best_action = -1
+        reduce = depth >= REDUCE_DEPTH
+        for i, action in enumerate(
+                self._ordered(board, table_action, killers, history)):
+            board.push(action)
+            if i == 0:
+                score = -self._negamax(
+                    board, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # show that it's no better than the best so far, reduced if
+                # it's a late action
+                late = reduce and i >= LATE_ACTIONS
+                score = -self._negamax(
+                    board, depth - 2 if late else depth - 1,
+                    -alpha - 1, -alpha, ply + 1)
+                if score > alpha and late:
+                    score = -self._negamax(
+                        board, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self._negamax(
+                        board, depth - 1, -beta, -alpha, ply + 1)
+            board.pop()
+            if score > best_score:
+                best_score = score
+                best_action = action
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        # a cutoff: remember the action
+                        if action != killers[0]:
+                            killers[1] = killers[0]
+                            killers[0] = action
+                        history[action] += depth * depth
+                        break
+
+        if best_score <= alpha_start:
+            kind = UPPER
+        elif best_score >= beta:
+            kind = LOWER
+        else:
+            kind = EXACT
+        table.store(key, _to_table(best_score, ply), depth, kind, best_action)
+        return best_score
+
+    def _ordered(self, board, table_action, killers, history):
+        "The legal actions of board, best first"
+        actions = list(board.legal_actions())
+        actions.sort(key=history.__getitem__, reverse=True)
+        first = [table_action] if table_action >= 0 else []
+        for killer in killers:
+            if killer >= 0 and killer != table_action and killer in actions:
+                first.append(killer)
+        if not first:
+            return actions
+        rest = [action for action in actions if action not in first]
+        return first + rest
+
+
+# wins (and losses) are scored by the plies from the root to the end of the
+# game, but kept in the table by the plies from the position itself
+def _to_table(score, ply):
+    if score > WIN_BOUND:
+        return score + ply
+    if score < -WIN_BOUND:
+        return score - ply
+    return score
+
+
+def _from_table(score, ply):
+    if score > WIN_BOUND:
+        return score - ply
+    if score < -WIN_BOUND:
+        return score + ply
+    return score
@@ -0,0 +1,22 @@
+# COMP30024 Artificial Intelligence, Semester 1 2023
+# Project Part B: Game Playing Agent
+
+from referee.game import CompactBoard
+
+
+# The agent's Board is the compact 49-byte board from the referee package (as
+# in agent3), so the search can play actions as integer ids with push/pop,
+# which allocate nothing. It adds the counts the evaluation needs.
+
+class Board(CompactBoard):
+    __slots__ = []
+
+    # the total power of the player to move, less their opponent's
+    def power_difference(self):
+        player = self._turn_color.value
+        return self._powers[player] - self._powers[1 - player]
+
+    # the number of cells of the player to move, less their opponent's
+    def cell_difference(self):
+        player = self._turn_color.value
+        return len(self._groups[player]) - len(self._groups[1 - player])
@@ -0,0 +1,32 @@
+# static values
+# the search depth when the referee sets no time limit
+SEARCH_DEPTH = 5
+# the deepest the iterative deepening goes
+MAX_DEPTH = 32
+# the evaluation: power difference, weighted, plus the difference in cells
+# (as a tie-break: more cells are harder to take over)
+POWER_WEIGHT = 4
+# the score of a won game (less the plies it takes to win it)
+WIN_SCORE = 1 << 16
+
+
+def evaluate(board):
+    """
+    This function is used to score a position which isn't terminal, for the
+    player to move.
+    """
+    return POWER_WEIGHT * board.power_difference() + board.cell_difference()
+
+
+def terminal_score(board, ply):
+    """
+    This function is used to score a finished game for the player to move,
+    ply plies into the search: the sooner a win (and the later a loss), the
+    better.
+    """
+    winner = board.winner_color
+    if winner is None:
+        return 0
+    if winner == board.turn_color:
+        return WIN_SCORE - ply
+    return ply - WIN_SCORE
@@ -0,0 +1,56 @@
+# COMP30024 Artificial Intelligence, Semester 1 2023
+# Project Part B: Game Playing Agent
+
+from referee.game import \
+    PlayerColor, Action, SpawnAction, SpreadAction
+from referee.game.actions import decode_action
+from referee.game.clock import move_deadline
+
+from . import game
+from .alpha_beta import AlphaBeta
+from .board import Board
+
+
+# This is the entry point for your game playing agent: a fixed depth alpha-
+# beta search (see alpha_beta.py) when the game isn't timed, and an iterative
+# deepening one until the time for the move is up otherwise.
+
+class Agent:
+    def __init__(self, color: PlayerColor, **referee: dict):
+        """
+        Initialise the agent.
+        """
+        self._color = color
+        self._board = Board()
+        # the search's table is sized to fit in the referee's space limit
+        self.search = AlphaBeta(space_limit=referee.get("space_limit"))
+        match color:
+            case PlayerColor.RED:
+                print("Testing: I am playing as red")
+            case PlayerColor.BLUE:
+                print("Testing: I am playing as blue")
+
+    def action(self, **referee: dict) -> Action:
+        """
+        Return the next action to take.
+        """
+        deadline = move_deadline(
+            self._board, referee.get("time_remaining"))
+        if deadline is None:
+            action = self.search.search(self._board, game.SEARCH_DEPTH)
+        else:
+            action = self.search.search(self._board, deadline=deadline)
+        print(f"alpha-beta: depth {self.search.depth}, score "
+              f"{self.search.score}, {self.search.nodes} nodes")
+        return decode_action(action)
+
+    def turn(self, color: PlayerColor, action: Action, **referee: dict):
+        """
+        Update the agent with the last player's action.
+        """
+        self._board.apply_action(action)
+        match action:
+            case SpawnAction(cell):
+                print(f"Testing: {color} SPAWN at {cell}")
+            case SpreadAction(cell, direction):
+                print(f"Testing: {color} SPREAD from {cell}, {direction}")
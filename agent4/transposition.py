@@ -0,0 +1,78 @@
+from array import array
+
+from referee.game.tables import ZOBRIST_TURNS
+
+# A transposition table for the alpha-beta search: what was found about each
+# position (its score, the depth it was searched to, whether the score is
+# exact or only a bound, and the best action), so that a position reached
+# again (by another move order, or in the next iteration of the deepening)
+# needn't be searched again, and its best action is tried first otherwise.
+#
+# The table has a fixed number of slots, in preallocated arrays, and a key
+# goes in the slot given by its low bits. A new entry replaces the old one
+# unless that one is from this search and was searched deeper. Keys are the
+# board's Zobrist key mixed with the turn count, as the end of the game (and
+# so a position's score) depends on it.
+
+# score kinds
+EXACT = 0
+LOWER = 1  # the score is at least this (the search failed high)
+UPPER = 2  # the score is at most this (the search failed low)
+
+# bytes per slot: key, score, depth, kind, action and age
+SLOT_BYTES = 8 + 4 + 1 + 1 + 2 + 2
+# the share of the referee's space limit the table may use (the limit is on
+# the peak virtual memory of the whole process, imports included)
+SPACE_SHARE = 0.25
+# the number of slots when there is no space limit
+DEFAULT_CAPACITY = 1 << 18
+
+
+class TranspositionTable:
+    # capacity is rounded down to a power of two
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        capacity = 1 << (capacity.bit_length() - 1)
+        self.mask = capacity - 1
+        # (made by repetition, so no temporary copy adds to the peak memory)
+        self.keys = array('Q', [0]) * capacity
+        self.scores = array('i', [0]) * capacity
+        self.depths = array('b', [-1]) * capacity
+        self.kinds = array('b', [0]) * capacity
+        self.actions = array('h', [-1]) * capacity
+        self.ages = array('H', [0]) * capacity
+        self.age = 0
+
+    # a table which fits in the given space limit (in MB, as the referee
+    # passes it), or a default sized one when there is no limit (None or 0)
+    @classmethod
+    def for_space_limit(cls, space_limit=None):
+        if not space_limit:
+            return cls()
+        budget = space_limit * SPACE_SHARE * 1024 * 1024
+        return cls(max(1024, min(DEFAULT_CAPACITY, int(budget // SLOT_BYTES))))
+
+    # start a new search: the entries of earlier ones are replaced first
+    def new_search(self):
+        self.age = (self.age + 1) & 0xFFFF
+
+    # the table key of a board's position
+    @staticmethod
+    def key(board):
+        return board.zobrist ^ ZOBRIST_TURNS[board.turn_count]
+
+    # the slot holding a key, or -1 if it isn't in the table
+    def find(self, key):
+        slot = key & self.mask
+        return slot if self.keys[slot] == key else -1
+
+    def store(self, key, score, depth, kind, action):
+        slot = key & self.mask
+        if self.keys[slot] != key and self.ages[slot] == self.age \
+                and self.depths[slot] > depth:
+            return  # keep the deeper entry
+        self.keys[slot] = key
+        self.scores[slot] = score
+        self.depths[slot] = depth
+        self.kinds[slot] = kind
+        self.actions[slot] = action
+        self.ages[slot] = self.age
@@ -9,6 +9,8 @@ from .constants import *
 from .hex import HexPos, HexDir
 from .player import Player
 from .board import Board, PlayerColor
+from .compact import CompactBoard
+from .search import SearchMixin
 from .actions import Action, SpawnAction, SpreadAction
 from .exceptions import PlayerException, IllegalActionException
 
@@ -92,8 +94,8 @@ async def game(
                 # Each loop iteration is a turn.
                 while True:
                     # Get the current player.
-                    turn_color: PlayerColor = board._turn_color
-                    player: Player = players[board._turn_color]
+                    turn_color: PlayerColor = board.turn_color
+                    player: Player = players[turn_color]
                     
                     # Get the current player's requested action.
                     turn_id = board.turn_count + 1
@@ -101,6 +103,12 @@ async def game(
                     action: Action = await player.action()
                     yield TurnEnd(turn_id, player, action)
 
+                    # Integer action ids are a trusted (unvalidated) fast
+                    # path of the board, so only accept real action objects.
+                    if not isinstance(action, (SpawnAction, SpreadAction)):
+                        raise IllegalActionException(
+                            f"Unknown action {action}", turn_color)
+
                     # Update the board state accordingly.
                     board.apply_action(action)
                     yield BoardUpdate(board)
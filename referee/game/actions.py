@@ -1,33 +1,147 @@
 # COMP30024 Artificial Intelligence, Semester 1 2023
 # Project Part B: Game Playing Agent
 
+from abc import abstractmethod
 from dataclasses import dataclass
 
 from .hex import HexPos, HexDir
+from .tables import CELL_COUNT, CELL_POS, DIR_COUNT, DIR_INDEX, HEX_DIRS
 
 
 # Here we define dataclasses for the two possible actions that a player can
 # make. See the `hex.py` file for the definition of the `HexPos` and `HexDir`.
 # If you are unfamiliar with dataclasses, see the relevant Python docs here:
 # https://docs.python.org/3/library/dataclasses.html 
+#
+# Every action also has a stable integer id (its "index"): SPAWN actions take
+# ids 0..CELL_COUNT-1 (the cell index), and SPREAD actions follow, at
+# CELL_COUNT + cell * DIR_COUNT + direction. There are only ACTION_COUNT (343)
+# distinct actions, so canonical instances of all of them are built once at
+# import time and can be looked up by id (see `decode_action`). Ids are what
+# search code should store and pass around; they are also how well-formed
+# actions are pickled, e.g. when sent between agent and referee processes.
+
+ACTION_COUNT = CELL_COUNT + CELL_COUNT * DIR_COUNT
+SPREAD_ID_BASE = CELL_COUNT
+
+
+class Action():
+    __slots__ = ()
+
+    @staticmethod
+    def from_index(index: int) -> 'Action':
+        """
+        Return the canonical (shared) action instance with the given index.
+        """
+        return ACTIONS[index]
+
+    @property
+    @abstractmethod
+    def index(self) -> int:
+        """
+        The integer index (id) of this action.
+        """
+        raise NotImplementedError
+
+    def __reduce_ex__(self, protocol):
+        # Pickle (and deep-copy) well-formed actions as their id, so they are
+        # compact and restored as the canonical instance. Anything malformed
+        # falls back to default pickling, and is rejected by board validation.
+        try:
+            return (decode_action, (self.index,))
+        except (AttributeError, KeyError, TypeError):
+            return super().__reduce_ex__(protocol)
 
 
 @dataclass(frozen=True, slots=True)
-class SpawnAction():
+class SpawnAction(Action):
     cell: HexPos
 
+    @property
+    def index(self) -> int:
+        return self.cell.index
+
     def __str__(self) -> str:
         return f"SPAWN({self.cell.r}, {self.cell.q})"
 
 
 @dataclass(frozen=True, slots=True)
-class SpreadAction():
+class SpreadAction(Action):
     cell: HexPos
     direction: HexDir
 
+    @property
+    def index(self) -> int:
+        return SPREAD_ID_BASE + self.cell.index * DIR_COUNT \
+            + DIR_INDEX[self.direction]
+
     def __str__(self) -> str:
         return f"SPREAD({self.cell.r}, {self.cell.q}, " + \
                f"{self.direction.r}, {self.direction.q})"
 
 
-Action = SpawnAction | SpreadAction
+# Canonical action instances. SPAWN_ACTIONS[i] spawns at cell i, and
+# SPREAD_ACTIONS[i] holds the DIR_COUNT spreads from cell i in direction order.
+SPAWN_ACTIONS: tuple[SpawnAction, ...] = tuple(
+    SpawnAction(pos) for pos in CELL_POS
+)
+SPREAD_ACTIONS: tuple[tuple[SpreadAction, ...], ...] = tuple(
+    tuple(SpreadAction(pos, dir) for dir in HEX_DIRS) for pos in CELL_POS
+)
+ACTIONS: tuple[Action, ...] = SPAWN_ACTIONS + tuple(
+    action for by_dir in SPREAD_ACTIONS for action in by_dir
+)
+
+# Decomposition of action ids: ACTION_CELLS[k] is the cell index the action
+# with id k acts on, and ACTION_DIRS[k] its direction index (-1 for SPAWN).
+ACTION_CELLS: tuple[int, ...] = tuple(
+    k if k < SPREAD_ID_BASE else (k - SPREAD_ID_BASE) // DIR_COUNT
+    for k in range(ACTION_COUNT)
+)
+ACTION_DIRS: tuple[int, ...] = tuple(
+    -1 if k < SPREAD_ID_BASE else (k - SPREAD_ID_BASE) % DIR_COUNT
+    for k in range(ACTION_COUNT)
+)
+
+# SPREAD_ACTION_IDS[i] is the range of ids of the DIR_COUNT spreads from cell i
+# (the SPAWN id of cell i is simply i).
+SPREAD_ACTION_IDS: tuple[range, ...] = tuple(
+    range(SPREAD_ID_BASE + i * DIR_COUNT, SPREAD_ID_BASE + (i + 1) * DIR_COUNT)
+    for i in range(CELL_COUNT)
+)
+
+
+def encode_action(action: Action) -> int:
+    """
+    Return the integer id of an action.
+    """
+    return action.index
+
+
+def decode_action(action_id: int) -> Action:
+    """
+    Return the canonical action instance with the given integer id.
+    """
+    return ACTIONS[action_id]
+
+
+def spawn_action_id(cell: int) -> int:
+    """
+    Return the id of the SPAWN action at the given cell index.
+    """
+    return cell
+
+
+def spread_action_id(cell: int, direction: int) -> int:
+    """
+    Return the id of the SPREAD action from the given cell index in the given
+    direction index.
+    """
+    return SPREAD_ID_BASE + cell * DIR_COUNT + direction
+
+
+def is_spawn_id(action_id: int) -> bool:
+    """
+    True iff the action id denotes a SPAWN action.
+    """
+    return action_id < SPREAD_ID_BASE
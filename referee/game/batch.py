@@ -0,0 +1,240 @@
+# COMP30024 Artificial Intelligence, Semester 1 2023
+# Project Part B: Game Playing Agent
+
+import numpy as np
+
+from .player import PlayerColor
+from .actions import ACTION_COUNT, ACTION_CELLS, ACTION_DIRS, SPREAD_ID_BASE
+from .tables import CELL_COUNT, CELL_POS, DIR_COUNT, SPREAD_CELLS
+from .board import CellState
+from .compact import CompactBoard
+from .constants import *
+
+
+# The BatchBoard class holds N independent games at once, and steps all of
+# them with a handful of NumPy operations per ply. It is meant for throughput
+# (many random playouts, self-play), not for validation: like the integer
+# action id path of the other engines, actions are trusted.
+#
+# NOTE: This module requires NumPy, which the rest of the package does not.
+# It is therefore not imported by `referee.game` itself; import it explicitly
+# (`from referee.game.batch import BatchBoard`) where NumPy is available.
+#
+# Boards use the same cell encoding as `CompactBoard`: cells is an (N, 49)
+# int8 array indexed by cell index (r * BOARD_N + q), where the sign gives the
+# owner (+ RED, - BLUE) and the magnitude gives the power (0 for empty).
+# Colours are stored as their `PlayerColor` values (0 RED, 1 BLUE), and -1
+# stands for "no player" (e.g. a drawn game).
+
+NO_PLAYER = -1
+
+# Per action id: source cell, and for SPREAD actions the destination cells for
+# each distance 1..MAX_CELL_POWER (the number used depends on the power of the
+# source stack at the time).
+_ACTION_CELL = np.array(ACTION_CELLS, dtype=np.intp)
+_ACTION_DESTS = np.array([
+    SPREAD_CELLS[cell][max(dir, 0)][MAX_CELL_POWER]
+    for cell, dir in zip(ACTION_CELLS, ACTION_DIRS)
+], dtype=np.intp)
+_DISTANCES = np.arange(1, MAX_CELL_POWER + 1, dtype=np.int8)
+
+# Sign of a colour's cells, indexed by `PlayerColor` value.
+_SIGN = np.array([1, -1], dtype=np.int8)
+
+
+class BatchBoard:
+    __slots__ = [
+        "cells",
+        "turn_colors",
+        "turn_counts"
+    ]
+
+    def __init__(self, n: int):
+        self.cells: np.ndarray = np.zeros((n, CELL_COUNT), dtype=np.int8)
+        self.turn_colors: np.ndarray = np.zeros(n, dtype=np.int8)
+        self.turn_counts: np.ndarray = np.zeros(n, dtype=np.int16)
+
+    @classmethod
+    def from_board(cls, board, n: int) -> 'BatchBoard':
+        """
+        Return a batch of n copies of the position of a single board (any of
+        the board engines, e.g. `Board` or `CompactBoard`).
+        """
+        batch = cls.__new__(cls)
+        batch.cells = np.tile(_board_cells(board), (n, 1))
+        batch.turn_colors = np.full(n, board.turn_color.value, dtype=np.int8)
+        batch.turn_counts = np.full(n, board.turn_count, dtype=np.int16)
+        return batch
+
+    @classmethod
+    def from_boards(cls, boards) -> 'BatchBoard':
+        """
+        Return a batch holding the positions of several boards (any of the
+        board engines), one per board, in order.
+        """
+        batch = cls.__new__(cls)
+        batch.cells = np.stack([_board_cells(board) for board in boards])
+        batch.turn_colors = np.array(
+            [board.turn_color.value for board in boards], dtype=np.int8)
+        batch.turn_counts = np.array(
+            [board.turn_count for board in boards], dtype=np.int16)
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def apply_actions(self, actions: np.ndarray, active: np.ndarray=None):
+        """
+        Apply one action id per board, in a single call. If given, `active`
+        is a boolean mask of the boards to step; the others are left as they
+        are (and their entries in `actions` are ignored). The actions are
+        assumed to be legal, and are not validated.
+        """
+        rows = stepped = np.arange(len(self.cells)) if active is None \
+            else np.flatnonzero(active)
+        actions = np.asarray(actions)[rows]
+        signs = _SIGN[self.turn_colors[rows]]
+        cells = self.cells
+
+        # SPAWN: a single token on an empty cell.
+        spawn = actions < SPREAD_ID_BASE
+        cells[rows[spawn], actions[spawn]] = signs[spawn]
+
+        # SPREAD: lift the stack off the source cell, then add a token to
+        # (and take over) each of the next `power` cells in the direction.
+        # Stacks which grow past the maximum cell power are removed.
+        spread = ~spawn
+        rows, actions, signs = rows[spread], actions[spread], signs[spread]
+        sources = _ACTION_CELL[actions]
+        powers = np.abs(cells[rows, sources])
+        cells[rows, sources] = 0
+        reached = _DISTANCES[None, :] <= powers[:, None]
+        dest_rows = np.broadcast_to(rows[:, None], reached.shape)[reached]
+        dests = _ACTION_DESTS[actions][reached]
+        grown = np.abs(cells[dest_rows, dests]) + 1
+        dest_signs = np.broadcast_to(signs[:, None], reached.shape)[reached]
+        cells[dest_rows, dests] = np.where(
+            grown > MAX_CELL_POWER, 0, grown * dest_signs)
+
+        self.turn_colors[stepped] ^= 1
+        self.turn_counts[stepped] += 1
+
+    def color_powers(self) -> np.ndarray:
+        """
+        The (N, 2) array of per-board power totals, indexed by board and then
+        `PlayerColor` value.
+        """
+        total = np.abs(self.cells).sum(axis=1, dtype=np.int16)
+        red = (self.cells.sum(axis=1, dtype=np.int16) + total) >> 1
+        return np.stack([red, total - red], axis=1)
+
+    @property
+    def game_over(self) -> np.ndarray:
+        """
+        The (N,) boolean mask of the boards whose game is over.
+        """
+        return self._game_over(self.color_powers())
+
+    @property
+    def winner_colors(self) -> np.ndarray:
+        """
+        The (N,) array of per-board winners, as `PlayerColor` values, with
+        NO_PLAYER for games which are not over or are drawn.
+        """
+        powers = self.color_powers()
+        diff = powers[:, 0] - powers[:, 1]
+        winners = np.full(len(self.cells), NO_PLAYER, dtype=np.int8)
+        winners[diff >= WIN_POWER_DIFF] = PlayerColor.RED.value
+        winners[diff <= -WIN_POWER_DIFF] = PlayerColor.BLUE.value
+        winners[~self._game_over(powers)] = NO_PLAYER
+        return winners
+
+    def legal_action_mask(self) -> np.ndarray:
+        """
+        The (N, 343) boolean mask of the legal action ids on each board, for
+        the player to move.
+        """
+        n = len(self.cells)
+        mask = np.empty((n, ACTION_COUNT), dtype=bool)
+        can_spawn = self.color_powers().sum(axis=1) < MAX_TOTAL_POWER
+        mask[:, :SPREAD_ID_BASE] = (self.cells == 0) & can_spawn[:, None]
+        own = self.cells * _SIGN[self.turn_colors][:, None] > 0
+        mask[:, SPREAD_ID_BASE:] = np.repeat(own, DIR_COUNT, axis=1)
+        return mask
+
+    def random_legal_actions(self, rng: np.random.Generator) -> np.ndarray:
+        """
+        Return one legal action id per board, chosen uniformly at random.
+        Boards with no legal actions get an arbitrary action id.
+        """
+        # As in `CompactBoard.random_legal_action`, pick the k-th legal action
+        # for a random k: the SPREAD actions are the player's cells times the
+        # directions, followed by the SPAWN actions (the empty cells). Only
+        # per-cell running counts are needed to find the k-th of those.
+        own = self.cells * _SIGN[self.turn_colors][:, None] > 0
+        empty = self.cells == 0
+        empty &= (self.color_powers().sum(axis=1) < MAX_TOTAL_POWER)[:, None]
+        own_counts = np.cumsum(own, axis=1, dtype=np.int8)
+        empty_counts = np.cumsum(empty, axis=1, dtype=np.int8)
+
+        spreads = own_counts[:, -1].astype(np.int16) * DIR_COUNT
+        legal = spreads + empty_counts[:, -1]
+        picks = (rng.random(len(self.cells)) * legal).astype(np.int16)
+        spread = picks < spreads
+        nth = np.where(spread, picks // DIR_COUNT, picks - spreads)
+        counts = np.where(spread[:, None], own_counts, empty_counts)
+        cells = (counts <= nth[:, None]).sum(axis=1)
+        cells = np.minimum(cells, CELL_COUNT - 1)
+        return np.where(
+            spread,
+            SPREAD_ID_BASE + cells * DIR_COUNT + picks % DIR_COUNT,
+            cells
+        )
+
+    def play_random(
+        self,
+        rng: np.random.Generator,
+        max_plies: int=MAX_TURNS
+    ) -> np.ndarray:
+        """
+        Play uniformly random legal actions on every board until its game is
+        over (or `max_plies` more turns have been played), and return the
+        winners (see `winner_colors`).
+        """
+        for _ in range(max_plies):
+            active = ~self.game_over
+            if not active.any():
+                break
+            self.apply_actions(self.random_legal_actions(rng), active)
+        return self.winner_colors
+
+    def render(self, index: int) -> str:
+        """
+        Return a visualisation of one of the boards (see `Board.render`).
+        """
+        return CompactBoard({
+            CELL_POS[cell]: CellState(
+                PlayerColor.RED if value > 0 else PlayerColor.BLUE,
+                abs(int(value)))
+            for cell, value in enumerate(self.cells[index]) if value
+        }).render()
+
+    def _game_over(self, powers: np.ndarray) -> np.ndarray:
+        return (self.turn_counts >= 2) & (
+            (self.turn_counts >= MAX_TURNS)
+            | (powers[:, 0] == 0)
+            | (powers[:, 1] == 0)
+        )
+
+
+def _board_cells(board) -> np.ndarray:
+    # The (49,) int8 cell values of a board, in the batch encoding.
+    if isinstance(board, CompactBoard):
+        # Same encoding, so the cells can be taken as they are.
+        return np.frombuffer(board._cells, dtype=np.int8)
+    cells = np.zeros(CELL_COUNT, dtype=np.int8)
+    for index, pos in enumerate(CELL_POS):
+        color, power = board[pos]
+        if color is not None:
+            cells[index] = _SIGN[color.value] * power
+    return cells
@@ -6,8 +6,12 @@ from dataclasses import dataclass
 
 from .hex import HexPos, HexDir
 from .player import PlayerColor
-from .actions import Action, SpawnAction, SpreadAction
+from .actions import Action, SpawnAction, SpreadAction, ACTION_CELLS, \
+    ACTION_DIRS, SPREAD_ID_BASE
 from .exceptions import IllegalActionException
+from .search import SearchMixin
+from .tables import CELL_POS, DIR_INDEX, SPREAD_CELLS, cell_index, \
+    ZOBRIST_CELLS, ZOBRIST_BLUE_TURN
 from .constants import *
 
 
@@ -32,6 +36,17 @@ class CellState:
         yield self.power
 
 
+# Shared cell state instances for the trusted apply path, indexed by player
+# value and then power (power 0 being the empty cell).
+
+EMPTY_CELL = CellState()
+CELL_STATES = tuple(
+    (EMPTY_CELL,) + tuple(
+        CellState(color, power) for power in range(1, MAX_CELL_POWER + 1))
+    for color in PlayerColor
+)
+
+
 @dataclass(frozen=True, slots=True)
 class CellMutation:
     cell: HexPos
@@ -42,6 +57,12 @@ class CellMutation:
         return f"CellMutation({self.cell}, {self.prev}, {self.next})"
 
 
+# Maximum size of one trusted undo frame: a (cell, state) pair for a SPREAD
+# source and up to MAX_CELL_POWER destinations, plus six scalars.
+
+UNDO_FRAME_SIZE = 2 * (MAX_CELL_POWER + 1) + 6
+
+
 # The BoardMutation class is used to represent the *minimal* set of changes in
 # the state of the board as a result of an action. 
 
@@ -64,20 +85,56 @@ class BoardMutation:
 # own agent; you should think carefully about how to design data structures for
 # representing the state of a game with respect to your chosen strategy. 
 
-class Board:
+class Board(SearchMixin):
     __slots__ = [
         "_mutable", 
         "_state", 
         "_turn_color", 
-        "_history"
+        "_history",
+        "_power_counts",
+        "_cell_counts",
+        "_zobrist",
+        "_undo",
+        "_undo_top",
+        "_debug"
     ]
 
-    def __init__(self, initial_state: dict[HexPos, CellState]={}):
+    def __init__(
+        self,
+        initial_state: dict[HexPos, CellState]={},
+        debug: bool=False
+    ):
         self._state: dict[HexPos, CellState] = \
             defaultdict(lambda: CellState(None, 0))
         self._state.update(initial_state)
         self._turn_color: PlayerColor = PlayerColor.RED
-        self._history: list[BoardMutation] = []
+        # Actions applied through `apply_action` are recorded as mutations.
+        # Those applied through `apply_trusted` are recorded as the action
+        # itself, with their undo information on the undo stack below.
+        self._history: list[BoardMutation | Action | int] = []
+
+        # Flat undo stack for trusted actions, preallocated for a full game
+        # (it grows if ever needed). Each frame holds a (cell, previous cell
+        # state) pair per mutated cell, then the previous Zobrist key, power
+        # counts and cell counts, and finally the number of pairs.
+        self._undo: list = [None] * (UNDO_FRAME_SIZE * MAX_TURNS)
+        self._undo_top: int = 0
+
+        # Running per-colour power and occupied cell counts (indexed by
+        # `PlayerColor` value), kept up to date by apply/undo so that power
+        # and terminal queries never need to scan the board. In debug mode
+        # they are cross-checked against a full scan after every update.
+        self._power_counts: list[int] = [0, 0]
+        self._cell_counts: list[int] = [0, 0]
+        self._debug: bool = debug
+        for cell_state in self._state.values():
+            self._count_cell(cell_state, 1)
+
+        # 64-bit Zobrist key of the position (cells and side to move), kept
+        # up to date incrementally from the cell mutations.
+        self._zobrist: int = 0
+        for cell, cell_state in self._state.items():
+            self._zobrist ^= self._cell_key(cell, cell_state)
 
     def __getitem__(self, cell: HexPos) -> CellState:
         """
@@ -91,8 +148,15 @@ class Board:
         """
         Apply an action to a board, mutating the board state. Throws an
         IllegalActionException if the action is invalid.
+
+        The action may also be given as an integer action id (see `actions`),
+        which is a trusted fast path for search code: the id is assumed to
+        be legal for the player to move, and is not validated.
         """
         match action:
+            case int():
+                self.apply_trusted(action)
+                return
             case SpawnAction():
                 res_action = self._resolve_spawn_action(action)
             case SpreadAction():
@@ -102,10 +166,18 @@ class Board:
                     f"Unknown action {action}", self._turn_color)
 
         for mutation in res_action.cell_mutations:
+            self._count_cell(mutation.prev, -1)
+            self._count_cell(mutation.next, 1)
+            self._zobrist ^= self._cell_key(mutation.cell, mutation.prev) \
+                ^ self._cell_key(mutation.cell, mutation.next)
             self._state[mutation.cell] = mutation.next
 
         self._history.append(res_action)
         self._turn_color = self._turn_color.opponent
+        self._zobrist ^= ZOBRIST_BLUE_TURN
+
+        if self._debug:
+            self._check_counts()
 
     def undo_action(self):
         """
@@ -115,10 +187,63 @@ class Board:
         if len(self._history) == 0:
             raise IndexError("No actions to undo.")
 
-        action: BoardMutation = self._history.pop()
+        action = self._history.pop()
+        if type(action) != BoardMutation:
+            self._undo_trusted()
+            return
+
         for mutation in action.cell_mutations:
+            self._count_cell(mutation.next, -1)
+            self._count_cell(mutation.prev, 1)
+            self._zobrist ^= self._cell_key(mutation.cell, mutation.next) \
+                ^ self._cell_key(mutation.cell, mutation.prev)
             self._state[mutation.cell] = mutation.prev
         self._turn_color = self._turn_color.opponent
+        self._zobrist ^= ZOBRIST_BLUE_TURN
+
+        if self._debug:
+            self._check_counts()
+
+    def apply_trusted(self, action: Action | int):
+        """
+        Apply an action (or action id) to the board without validating it.
+        The action is assumed to be legal for the player to move. This path
+        builds no mutation objects: changes are recorded on a flat undo
+        stack, and `undo_action` takes them back as usual.
+        """
+        if type(action) != int:
+            action = action.index
+
+        undo, top = self._undo, self._undo_top
+        if top + UNDO_FRAME_SIZE > len(undo):
+            undo.extend([None] * (UNDO_FRAME_SIZE * MAX_TURNS))
+
+        # Save the scalars first, the cells are recorded as they change.
+        powers, counts = self._power_counts, self._cell_counts
+        zobrist = self._zobrist
+        red_power, blue_power = powers
+        red_cells, blue_cells = counts
+
+        if action < SPREAD_ID_BASE:
+            top = self._trusted_spawn(action, top)
+        else:
+            top = self._trusted_spread(
+                ACTION_CELLS[action], ACTION_DIRS[action], top)
+
+        undo[top] = zobrist
+        undo[top + 1] = red_power
+        undo[top + 2] = blue_power
+        undo[top + 3] = red_cells
+        undo[top + 4] = blue_cells
+        undo[top + 5] = (top - self._undo_top) >> 1
+        self._undo_top = top + 6
+
+        self._history.append(action)
+        self._turn_color = self._turn_color.opponent
+        self._zobrist ^= ZOBRIST_BLUE_TURN
+
+        if self._debug:
+            self._check_counts()
 
     def render(self, use_color: bool=False, use_unicode: bool=False) -> str:
         """
@@ -145,7 +270,7 @@ class Board:
                 r = max((dim - 1) - row, 0) + col
                 q = max(row - (dim - 1), 0) + col
                 if self._cell_occupied(HexPos(r, q)):
-                    color, power = self._state[HexPos(r, q)]
+                    color, power = self[HexPos(r, q)]
                     color = "r" if color == PlayerColor.RED else "b"
                     text = f"{color}{power}".center(4)
                     if use_color:
@@ -172,6 +297,14 @@ class Board:
         """
         return self._turn_color
     
+    @property
+    def zobrist(self) -> int:
+        """
+        64-bit Zobrist key of the position, including the side to move. Equal
+        positions always have equal keys.
+        """
+        return self._zobrist
+
     @property
     def game_over(self) -> bool:
         """
@@ -180,11 +313,9 @@ class Board:
         if self.turn_count < 2: 
             return False
         
-        return any([
-            self.turn_count >= MAX_TURNS,
-            self._color_power(PlayerColor.RED) == 0,
-            self._color_power(PlayerColor.BLUE) == 0
-        ])
+        return self.turn_count >= MAX_TURNS \
+            or self._power_counts[PlayerColor.RED.value] == 0 \
+            or self._power_counts[PlayerColor.BLUE.value] == 0
     
     @property
     def winner_color(self) -> PlayerColor | None:
@@ -207,7 +338,7 @@ class Board:
         """
         The total power of all cells on the board.
         """
-        return sum(map(lambda cell: cell.power, self._state.values()))
+        return self._power_counts[0] + self._power_counts[1]
     
     def _player_cells(self, color: PlayerColor) -> list[CellState]:
         return list(filter(
@@ -216,7 +347,44 @@ class Board:
         ))
 
     def _color_power(self, color: PlayerColor) -> int:
-        return sum(map(lambda cell: cell.power, self._player_cells(color)))
+        return self._power_counts[color.value]
+
+    def _color_cell_count(self, color: PlayerColor) -> int:
+        return self._cell_counts[color.value]
+
+    def _count_cell(self, cell_state: CellState, sign: int):
+        if cell_state.player is not None:
+            self._power_counts[cell_state.player.value] += \
+                sign * cell_state.power
+            self._cell_counts[cell_state.player.value] += sign
+
+    def _cell_key(self, cell: HexPos, cell_state: CellState) -> int:
+        if cell_state.player is None:
+            return 0
+        return ZOBRIST_CELLS[cell_index(cell)] \
+            [cell_state.player.value][cell_state.power]
+
+    def _check_counts(self):
+        """
+        Debug check: assert that the running power and cell counts, and the
+        Zobrist key, agree with a full scan of the board state.
+        """
+        for color in PlayerColor:
+            cells = self._player_cells(color)
+            scanned_power = sum(map(lambda cell: cell.power, cells))
+            assert self._power_counts[color.value] == scanned_power, \
+                f"{color} power count {self._power_counts[color.value]} " \
+                f"!= scanned power {scanned_power}"
+            assert self._cell_counts[color.value] == len(cells), \
+                f"{color} cell count {self._cell_counts[color.value]} " \
+                f"!= scanned cell count {len(cells)}"
+
+        scanned_key = ZOBRIST_BLUE_TURN \
+            if self._turn_color == PlayerColor.BLUE else 0
+        for cell, cell_state in self._state.items():
+            scanned_key ^= self._cell_key(cell, cell_state)
+        assert self._zobrist == scanned_key, \
+            f"Zobrist key {self._zobrist:#x} != scanned key {scanned_key:#x}"
     
     def _within_bounds(self, coord: HexPos) -> bool:
         r, q = coord
@@ -264,12 +432,7 @@ class Board:
             raise IllegalActionException(
                 f"Cell {cell} is occupied.", self._turn_color)
 
-        return BoardMutation(
-            action,
-            cell_mutations={CellMutation(cell, self._state[cell], 
-                                         CellState(self._turn_color, 1)
-            )},
-        )
+        return self._spawn_mutation(action, cell)
 
     def _resolve_spread_action(self, action: SpreadAction) -> BoardMutation:
         self._validate_spread_action_input(action)
@@ -282,9 +445,30 @@ class Board:
                 f"SPREAD cell {from_cell} not occupied by {action_player}",
                 self._turn_color)
 
-        # Compute destination cell coords.
+        return self._spread_mutation(
+            action, cell_index(from_cell), DIR_INDEX[dir])
+
+    def _spawn_mutation(self, action: Action, cell: HexPos) -> BoardMutation:
+        return BoardMutation(
+            action,
+            cell_mutations={CellMutation(cell, self._state[cell], 
+                                         CellState(self._turn_color, 1)
+            )},
+        )
+
+    def _spread_mutation(
+        self,
+        action: Action,
+        from_index: int,
+        dir_index: int
+    ) -> BoardMutation:
+        from_cell = CELL_POS[from_index]
+        action_player: PlayerColor = self._turn_color
+
+        # Look up destination cell coords (torus wrapping is precomputed).
         to_cells = [
-            from_cell + dir * (i + 1) for i in range(self[from_cell].power)
+            CELL_POS[i] for i in SPREAD_CELLS[from_index]
+                [dir_index][self._state[from_cell].power]
         ]
 
         return BoardMutation(
@@ -299,3 +483,79 @@ class Board:
                 ) for to_cell in to_cells
             }
         )
+
+    def _trusted_spawn(self, index: int, top: int) -> int:
+        cell = CELL_POS[index]
+        player = self._turn_color.value
+        self._undo[top] = cell
+        self._undo[top + 1] = self._state[cell]
+        self._state[cell] = CELL_STATES[player][1]
+        self._power_counts[player] += 1
+        self._cell_counts[player] += 1
+        self._zobrist ^= ZOBRIST_CELLS[index][player][1]
+        return top + 2
+
+    def _trusted_spread(
+        self,
+        from_index: int,
+        dir_index: int,
+        top: int
+    ) -> int:
+        state, undo = self._state, self._undo
+        powers, counts = self._power_counts, self._cell_counts
+        player = self._turn_color.value
+        cell_states = CELL_STATES[player]
+
+        # Remove token stack from source cell.
+        from_cell = CELL_POS[from_index]
+        prev = state[from_cell]
+        undo[top] = from_cell
+        undo[top + 1] = prev
+        top += 2
+        state[from_cell] = EMPTY_CELL
+        powers[player] -= prev.power
+        counts[player] -= 1
+        zobrist = self._zobrist ^ ZOBRIST_CELLS[from_index][player][prev.power]
+
+        # Add a token to each destination cell, taking it over. Stacks which
+        # grow past the maximum cell power are removed from the board.
+        for index in SPREAD_CELLS[from_index][dir_index][prev.power]:
+            to_cell = CELL_POS[index]
+            to_prev = state[to_cell]
+            undo[top] = to_cell
+            undo[top + 1] = to_prev
+            top += 2
+            keys = ZOBRIST_CELLS[index]
+            power = to_prev.power
+            if to_prev.player is not None:
+                owner = to_prev.player.value
+                powers[owner] -= power
+                counts[owner] -= 1
+                zobrist ^= keys[owner][power]
+            if power < MAX_CELL_POWER:
+                state[to_cell] = cell_states[power + 1]
+                powers[player] += power + 1
+                counts[player] += 1
+                zobrist ^= keys[player][power + 1]
+            else:
+                state[to_cell] = EMPTY_CELL
+
+        self._zobrist = zobrist
+        return top
+
+    def _undo_trusted(self):
+        state, undo = self._state, self._undo
+        top = self._undo_top - 6
+        self._zobrist = undo[top]
+        self._power_counts[0] = undo[top + 1]
+        self._power_counts[1] = undo[top + 2]
+        self._cell_counts[0] = undo[top + 3]
+        self._cell_counts[1] = undo[top + 4]
+        for _ in range(undo[top + 5]):
+            top -= 2
+            state[undo[top]] = undo[top + 1]
+        self._undo_top = top
+        self._turn_color = self._turn_color.opponent
+
+        if self._debug:
+            self._check_counts()
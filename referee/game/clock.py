@@ -0,0 +1,48 @@
+# COMP30024 Artificial Intelligence, Semester 1 2023
+# Project Part B: Game Playing Agent
+
+import time
+
+from .constants import MAX_TURNS
+
+
+# The move time budget shared by the anytime searches (when the referee sets
+# a time limit): each move may use the remaining CPU time, less TIME_MARGIN
+# seconds kept back for the referee and for the agent's own updates, spread
+# over the moves the agent expects to still have to make (half the turns
+# left, but at least MIN_MOVES_LEFT and at most MAX_MOVES_LEFT).
+#
+# The referee charges an agent for its process's CPU time, so deadlines are
+# `time.process_time()` values. Tree searches check the clock every
+# CLOCK_CHECK_EVERY iterations (see `out_of_time`).
+
+TIME_MARGIN = 1.0
+MIN_MOVES_LEFT = 10
+MAX_MOVES_LEFT = 60
+CLOCK_CHECK_EVERY = 4
+
+
+def move_deadline(board, time_remaining: float | None) -> float | None:
+    """
+    Return the time to stop searching for the next move from the position of
+    `board` (any of the board engines), as a `time.process_time()` value, or
+    None when there is no time limit.
+    """
+    if time_remaining is None:
+        return None
+    turns_left = MAX_TURNS - board.turn_count
+    moves_left = min(
+        MAX_MOVES_LEFT, max(MIN_MOVES_LEFT, (turns_left + 1) // 2))
+    budget = max(0.0, time_remaining - TIME_MARGIN) / moves_left
+    return time.process_time() + budget
+
+
+def out_of_time(deadline: float | None, iteration: int) -> bool:
+    """
+    Return whether a search with the given deadline should stop before its
+    next iteration: the clock is only read every CLOCK_CHECK_EVERY
+    iterations, and never before the first one.
+    """
+    return deadline is not None and iteration > 0 \
+        and iteration % CLOCK_CHECK_EVERY == 0 \
+        and time.process_time() >= deadline
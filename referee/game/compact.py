@@ -0,0 +1,449 @@
+# COMP30024 Artificial Intelligence, Semester 1 2023
+# Project Part B: Game Playing Agent
+
+from array import array
+from random import Random
+from typing import Iterator
+
+from .hex import HexPos, HexDir
+from .player import PlayerColor
+from .actions import Action, SpawnAction, SpreadAction, ACTION_CELLS, \
+    ACTION_COUNT, ACTION_DIRS, SPREAD_ID_BASE, SPREAD_ACTION_IDS
+from .board import Board, CellState
+from .exceptions import IllegalActionException
+from .search import SearchMixin
+from .symmetry import canonical_cells, transform_key
+from .tables import CELL_COUNT, DIR_COUNT, DIR_INDEX, SPREAD_CELLS, \
+    ZOBRIST_CELLS, ZOBRIST_BLUE_TURN, cell_index
+from .constants import *
+
+
+# The CompactBoard class is a board representation aimed at search code that
+# needs to copy positions a lot. The whole position is a 49-byte signed array,
+# one byte per cell index (r * BOARD_N + q): the sign gives the owner, using
+# the zero-sum form of `PlayerColor` (+ RED, - BLUE), and the magnitude gives
+# the power (0 for an empty cell). Per-colour power totals and the Zobrist key
+# are maintained incrementally alongside it.
+#
+# `copy()` is a single buffer copy plus a few scalars: unlike `Board`, the
+# copy starts with an empty undo history (it still knows the turn count), so
+# its cost does not grow over the course of the game.
+#
+# The board also keeps the cells grouped by content (RED, BLUE and empty), as
+# unordered lists with a reverse index for O(1) removal. This lets it count
+# the legal actions, and sample one uniformly at random, in O(1).
+
+_SIGN = (1, -1)
+
+# Group of a cell value (offset by MAX_CELL_POWER): RED, BLUE or empty.
+RED_CELLS, BLUE_CELLS, EMPTY_CELLS = 0, 1, 2
+_GROUP = (BLUE_CELLS,) * MAX_CELL_POWER + (EMPTY_CELLS,) \
+    + (RED_CELLS,) * MAX_CELL_POWER
+
+
+class CompactBoard(SearchMixin):
+    __slots__ = [
+        "_cells",
+        "_turn_color",
+        "_turn_count",
+        "_powers",
+        "_zobrist",
+        "_history",
+        "_undo",
+        "_groups",
+        "_slots"
+    ]
+
+    def __init__(self, initial_state: dict[HexPos, CellState]={}):
+        self._cells: array = array("b", bytes(CELL_COUNT))
+        self._turn_color: PlayerColor = PlayerColor.RED
+        self._turn_count: int = 0
+        # Power totals, indexed by `PlayerColor` value.
+        self._powers: list[int] = [0, 0]
+        self._zobrist: int = 0
+        # The actions played (as given, i.e. possibly action ids), and a flat
+        # undo log of plain ints. Per action, the log holds a (cell index,
+        # previous value) pair for each mutated cell, followed by the previous
+        # RED power, BLUE power and Zobrist key, and finally the pair count.
+        # Applying and undoing actions therefore allocates no objects.
+        self._history: list[Action | int] = []
+        self._undo: list[int] = []
+
+        for cell, cell_state in initial_state.items():
+            if cell_state.player is None:
+                continue
+            index = cell_index(cell)
+            player = cell_state.player.value
+            self._cells[index] = _SIGN[player] * cell_state.power
+            self._powers[player] += cell_state.power
+            self._zobrist ^= ZOBRIST_CELLS[index][player][cell_state.power]
+
+        # Cell indices by group (see `_GROUP`), and the position of each cell
+        # within its group's list.
+        self._groups: list[list[int]] = [[], [], []]
+        self._slots: array = array("b", bytes(CELL_COUNT))
+        for index, value in enumerate(self._cells):
+            group = self._groups[_GROUP[value + MAX_CELL_POWER]]
+            self._slots[index] = len(group)
+            group.append(index)
+
+    def __getitem__(self, cell: HexPos) -> CellState:
+        """
+        Return the state of a cell on the board.
+        """
+        if not self._within_bounds(cell):
+            raise IndexError(f"Cell position '{cell}' is invalid.")
+        value = self._cells[cell.r * BOARD_N + cell.q]
+        if value > 0:
+            return CellState(PlayerColor.RED, value)
+        if value < 0:
+            return CellState(PlayerColor.BLUE, -value)
+        return CellState()
+
+    def copy(self) -> 'CompactBoard':
+        """
+        Return a copy of the position (without undo history) in O(cells).
+        """
+        new_board = CompactBoard.__new__(self.__class__)
+        new_board._cells = self._cells[:]
+        new_board._turn_color = self._turn_color
+        new_board._turn_count = self._turn_count
+        new_board._powers = self._powers[:]
+        new_board._zobrist = self._zobrist
+        new_board._history = []
+        new_board._undo = []
+        new_board._groups = [group[:] for group in self._groups]
+        new_board._slots = self._slots[:]
+        return new_board
+
+    def __deepcopy__(self, memodict={}):
+        return self.copy()
+
+    def apply_action(self, action: Action | int):
+        """
+        Apply an action to a board, mutating the board state. Throws an
+        IllegalActionException if the action is invalid.
+
+        The action may also be given as an integer action id (see `actions`),
+        which is a trusted fast path for search code: the id is assumed to
+        be legal for the player to move, and is not validated.
+        """
+        undo = self._undo
+        undo_start = len(undo)
+        red_power, blue_power = self._powers
+        zobrist = self._zobrist
+        match action:
+            case int():
+                if action < SPREAD_ID_BASE:
+                    self._spawn(action)
+                else:
+                    self._spread(ACTION_CELLS[action], ACTION_DIRS[action])
+            case SpawnAction():
+                self._validate_spawn_action(action)
+                self._spawn(action.cell.r * BOARD_N + action.cell.q)
+            case SpreadAction():
+                self._validate_spread_action(action)
+                self._spread(
+                    action.cell.r * BOARD_N + action.cell.q,
+                    DIR_INDEX[action.direction]
+                )
+            case _:
+                raise IllegalActionException(
+                    f"Unknown action {action}", self._turn_color)
+
+        undo.append(red_power)
+        undo.append(blue_power)
+        undo.append(zobrist)
+        undo.append((len(undo) - 3 - undo_start) >> 1)
+        self._history.append(action)
+        self._turn_color = self._turn_color.opponent
+        self._turn_count += 1
+        self._zobrist ^= ZOBRIST_BLUE_TURN
+
+    def apply_trusted(self, action: Action | int):
+        """
+        Apply an action (or action id) to the board without validating it.
+        The action is assumed to be legal for the player to move.
+        """
+        if type(action) != int:
+            action = action.index
+        self.apply_action(action)
+
+    def undo_action(self):
+        """
+        Undo the last action played, mutating the board state. Throws an
+        IndexError if no actions have been played (since this board, or the
+        board it was copied from, was created).
+        """
+        if len(self._history) == 0:
+            raise IndexError("No actions to undo.")
+
+        self._history.pop()
+        undo, cells = self._undo, self._cells
+        count = undo.pop()
+        self._zobrist = undo.pop()
+        self._powers[1] = undo.pop()
+        self._powers[0] = undo.pop()
+        for _ in range(count):
+            value = undo.pop()
+            index = undo.pop()
+            self._regroup(index, cells[index], value)
+            cells[index] = value
+        self._turn_color = self._turn_color.opponent
+        self._turn_count -= 1
+
+    # Rendering only relies on `__getitem__` and `_cell_occupied`, so the
+    # visualisation is shared with the reference board implementation.
+    render = Board.render
+
+    @property
+    def turn_count(self) -> int:
+        """
+        The number of actions that have been played so far.
+        """
+        return self._turn_count
+
+    @property
+    def turn_color(self) -> PlayerColor:
+        """
+        The player (color) whose turn it is.
+        """
+        return self._turn_color
+
+    @property
+    def zobrist(self) -> int:
+        """
+        64-bit Zobrist key of the position, including the side to move. Equal
+        positions always have equal keys (and the same key as on `Board`).
+        """
+        return self._zobrist
+
+    @property
+    def game_over(self) -> bool:
+        """
+        True iff the game is over.
+        """
+        if self._turn_count < 2:
+            return False
+
+        return self._turn_count >= MAX_TURNS \
+            or self._powers[0] == 0 \
+            or self._powers[1] == 0
+
+    @property
+    def winner_color(self) -> PlayerColor | None:
+        """
+        The player (color) who won the game, or None if no player has won.
+        """
+        if not self.game_over:
+            return None
+
+        red_power, blue_power = self._powers
+
+        if abs(red_power - blue_power) < WIN_POWER_DIFF:
+            return None
+
+        return (PlayerColor.RED, PlayerColor.BLUE)[red_power < blue_power]
+
+    @property
+    def _total_power(self) -> int:
+        """
+        The total power of all cells on the board.
+        """
+        return self._powers[0] + self._powers[1]
+
+    def _color_power(self, color: PlayerColor) -> int:
+        return self._powers[color.value]
+
+    def canonical(self) -> tuple[int, int]:
+        """
+        Return the canonical key of the position under the board symmetries
+        (torus translations, rotations and reflections), and the transform
+        mapping this position onto its canonical form (see `symmetry`, e.g.
+        `transform_action` to map actions into the canonical frame). Positions
+        which are equivalent (with the same player to move) share a key.
+        """
+        return canonical_cells(
+            self._cells, self._turn_color == PlayerColor.BLUE)
+
+    def transformed_zobrist(self, transform: int) -> int:
+        """
+        Return the Zobrist key of the image of the position under a board
+        symmetry (see `symmetry`), i.e. the key of the equivalent position
+        with every cell and action mapped through the transform.
+        """
+        return transform_key(
+            self._cells, self._turn_color == PlayerColor.BLUE, transform)
+
+    def legal_actions(self) -> Iterator[int]:
+        """
+        Iterate over the ids of the legal actions for the player to move
+        (SPREAD actions first, then SPAWN actions), in no particular order.
+        """
+        for index in self._groups[self._turn_color.value]:
+            yield from SPREAD_ACTION_IDS[index]
+        if self._powers[0] + self._powers[1] < MAX_TOTAL_POWER:
+            # The SPAWN action id of a cell is its index.
+            yield from self._groups[EMPTY_CELLS]
+
+    def is_legal(self, action: int) -> bool:
+        """
+        Return whether an action id is legal for the player to move (a check
+        for search code to make, when debugging, on the trusted ids it plays).
+        """
+        if not 0 <= action < ACTION_COUNT:
+            return False
+        if action < SPREAD_ID_BASE:
+            # The SPAWN action id of a cell is its index.
+            return self._cells[action] == 0 \
+                and self._powers[0] + self._powers[1] < MAX_TOTAL_POWER
+        return self._cells[ACTION_CELLS[action]] \
+            * _SIGN[self._turn_color.value] > 0
+
+    def legal_action_count(self) -> int:
+        """
+        The number of legal actions for the player to move.
+        """
+        count = len(self._groups[self._turn_color.value]) * DIR_COUNT
+        if self._powers[0] + self._powers[1] < MAX_TOTAL_POWER:
+            count += len(self._groups[EMPTY_CELLS])
+        return count
+
+    def random_legal_action(self, rng: Random) -> int:
+        """
+        The id of a legal action for the player to move, chosen uniformly at
+        random (using `rng`, e.g. a `random.Random` or the `random` module) in
+        O(1). Throws an IndexError if there are no legal actions.
+        """
+        own = self._groups[self._turn_color.value]
+        spreads = len(own) * DIR_COUNT
+        count = spreads
+        if self._powers[0] + self._powers[1] < MAX_TOTAL_POWER:
+            count += len(self._groups[EMPTY_CELLS])
+        if count == 0:
+            raise IndexError("No legal actions.")
+
+        choice = int(rng.random() * count)
+        if choice < spreads:
+            return SPREAD_ID_BASE + own[choice // DIR_COUNT] * DIR_COUNT \
+                + choice % DIR_COUNT
+        return self._groups[EMPTY_CELLS][choice - spreads]
+
+    def _color_cell_indices(self, color: PlayerColor) -> list[int]:
+        return self._groups[color.value][:]
+
+    def _empty_cell_indices(self) -> list[int]:
+        return self._groups[EMPTY_CELLS][:]
+
+    def _regroup(self, index: int, old_value: int, new_value: int):
+        """
+        Move a cell to the right group for its new value.
+        """
+        old = _GROUP[old_value + MAX_CELL_POWER]
+        new = _GROUP[new_value + MAX_CELL_POWER]
+        if old == new:
+            return
+        groups, slots = self._groups, self._slots
+        members = groups[old]
+        last = members.pop()
+        if last != index:
+            slot = slots[index]
+            members[slot] = last
+            slots[last] = slot
+        members = groups[new]
+        slots[index] = len(members)
+        members.append(index)
+
+    def _within_bounds(self, coord: HexPos) -> bool:
+        return 0 <= coord.r < BOARD_N and 0 <= coord.q < BOARD_N
+
+    def _cell_occupied(self, coord: HexPos) -> bool:
+        return self._cells[coord.r * BOARD_N + coord.q] != 0
+
+    def _spawn(self, index: int):
+        player = self._turn_color.value
+        self._undo.append(index)
+        self._undo.append(0)
+        self._regroup(index, 0, _SIGN[player])
+        self._cells[index] = _SIGN[player]
+        self._powers[player] += 1
+        self._zobrist ^= ZOBRIST_CELLS[index][player][1]
+
+    def _spread(self, index: int, dir_index: int):
+        cells, powers, undo = self._cells, self._powers, self._undo
+        player = self._turn_color.value
+        sign = _SIGN[player]
+
+        # Lift the token stack off the source cell.
+        power = cells[index] * sign
+        undo.append(index)
+        undo.append(cells[index])
+        self._regroup(index, cells[index], 0)
+        cells[index] = 0
+        powers[player] -= power
+        zobrist = self._zobrist ^ ZOBRIST_CELLS[index][player][power]
+
+        # Add a token to each destination, taking it over. Stacks which grow
+        # past the maximum cell power are removed from the board.
+        for cell in SPREAD_CELLS[index][dir_index][power]:
+            keys = ZOBRIST_CELLS[cell]
+            value = cells[cell]
+            undo.append(cell)
+            undo.append(value)
+            if value:
+                owner = value < 0
+                cell_power = -value if owner else value
+                powers[owner] -= cell_power
+                zobrist ^= keys[owner][cell_power]
+            else:
+                cell_power = 0
+            if cell_power < MAX_CELL_POWER:
+                self._regroup(cell, value, sign)
+                cells[cell] = sign * (cell_power + 1)
+                powers[player] += cell_power + 1
+                zobrist ^= keys[player][cell_power + 1]
+            else:
+                self._regroup(cell, value, 0)
+                cells[cell] = 0
+
+        self._zobrist = zobrist
+
+    def _validate_action_pos_input(self, pos: HexPos):
+        if type(pos) != HexPos or not self._within_bounds(pos):
+            raise IllegalActionException(
+                f"'{pos}' is not a valid position.", self._turn_color)
+
+    def _validate_action_dir_input(self, dir: HexDir):
+        if type(dir) != HexDir:
+            raise IllegalActionException(
+                f"'{dir}' is not a valid direction.", self._turn_color)
+
+    def _validate_spawn_action(self, action: SpawnAction):
+        if type(action) != SpawnAction:
+            raise IllegalActionException(
+                f"Action '{action}' is not a SPAWN action.", self._turn_color)
+
+        self._validate_action_pos_input(action.cell)
+
+        if self._total_power >= MAX_TOTAL_POWER:
+            raise IllegalActionException(
+                f"Total board power max reached ({MAX_TOTAL_POWER})",
+                self._turn_color)
+
+        if self._cell_occupied(action.cell):
+            raise IllegalActionException(
+                f"Cell {action.cell} is occupied.", self._turn_color)
+
+    def _validate_spread_action(self, action: SpreadAction):
+        if type(action) != SpreadAction:
+            raise IllegalActionException(
+                f"Action '{action}' is not a SPREAD action.", self._turn_color)
+
+        self._validate_action_pos_input(action.cell)
+        self._validate_action_dir_input(action.direction)
+
+        value = self._cells[action.cell.r * BOARD_N + action.cell.q]
+        if value * _SIGN[self._turn_color.value] <= 0:
+            raise IllegalActionException(
+                f"SPREAD cell {action.cell} not occupied by "
+                f"{self._turn_color}", self._turn_color)
@@ -66,6 +66,20 @@ class HexDir(Enum):
     def __mul__(self, n: int) -> 'HexVec':
         return self.value * n
 
+    @classmethod
+    def at(cls, index: int) -> 'HexDir':
+        """
+        Return the direction with the given index (enumeration order).
+        """
+        return _HEX_DIRS[index]
+
+    @property
+    def index(self) -> int:
+        """
+        The index of this direction in enumeration order (0..5).
+        """
+        return _HEX_DIR_INDEX[self]
+
     def __str__(self) -> str:
         return {
             HexDir.DownRight: "[↘]",
@@ -99,6 +113,21 @@ class HexPos(HexVec):
         if not (0 <= self.r < BOARD_N) or not (0 <= self.q < BOARD_N):
             raise ValueError(f"Out-of-bounds board position: {self}")
 
+    @classmethod
+    def at(cls, index: int) -> 'HexPos':
+        """
+        Return the canonical (shared) instance of the position with the given
+        cell index, where cell (r, q) has index r * BOARD_N + q.
+        """
+        return _HEX_POSITIONS[index]
+
+    @property
+    def index(self) -> int:
+        """
+        The cell index of this position (r * BOARD_N + q).
+        """
+        return self.r * BOARD_N + self.q
+
     def __str__(self):
         return f"{self.r}-{self.q}"
 
@@ -113,3 +142,13 @@ class HexPos(HexVec):
             (self.r - other.r) % BOARD_N, 
             (self.q - other.q) % BOARD_N
         )
+
+
+# Canonical instances. There are only BOARD_N * BOARD_N positions and six
+# directions, and both types are immutable, so hot paths (move generation,
+# rollouts) can share these rather than allocating new objects.
+_HEX_DIRS: tuple[HexDir, ...] = tuple(HexDir)
+_HEX_DIR_INDEX: dict[HexDir, int] = {dir: d for d, dir in enumerate(_HEX_DIRS)}
+_HEX_POSITIONS: tuple[HexPos, ...] = tuple(
+    HexPos(r, q) for r in range(BOARD_N) for q in range(BOARD_N)
+)
@@ -0,0 +1,109 @@
+# COMP30024 Artificial Intelligence, Semester 1 2023
+# Project Part B: Game Playing Agent
+
+from random import Random
+
+from .player import PlayerColor
+from .tables import CELL_COUNT, CELL_POS, DIR_COUNT, SPREAD_CELLS
+from .compact import CompactBoard
+from .constants import *
+
+
+# A dedicated random playout routine, for rollout-heavy search. Rather than
+# going through a board's apply/undo machinery, it plays on a private flat
+# list of signed cell values (as in `CompactBoard`: + RED, - BLUE, magnitude
+# is power) with the power totals in local variables, and leaves the board
+# it started from untouched.
+#
+# Moves are sampled without building a move list, by rejection: every action
+# id slot (a cell and one of its six directions, or the cell's SPAWN) is
+# equally likely to be drawn, and draws are repeated until a legal one comes
+# up. This is exactly uniform over the legal actions, and allocates nothing.
+
+# Slot s in 0..CELL_COUNT * (DIR_COUNT + 1) stands for cell s // 7 and, for
+# the remainder k, SPREAD in direction k (k < DIR_COUNT) or SPAWN otherwise.
+_SLOT_COUNT = CELL_COUNT * (DIR_COUNT + 1)
+_SLOTS: tuple[tuple[int, int], ...] = tuple(
+    divmod(slot, DIR_COUNT + 1) for slot in range(_SLOT_COUNT))
+
+
+def playout(
+    board,
+    rng: Random,
+    max_plies: int | None=None
+) -> PlayerColor | None:
+    """
+    Play uniformly random legal actions from the position of a board (any of
+    the board engines) until the game is over, and return the winner (None
+    for a draw). The board itself is not modified.
+
+    If `max_plies` is given, stop after that many plies at most, and score
+    the position reached as if the game ended there: the player with a power
+    lead of at least WIN_POWER_DIFF wins.
+    """
+    if isinstance(board, CompactBoard):
+        cells = board._cells.tolist()
+    else:
+        cells = [0] * CELL_COUNT
+        for index, pos in enumerate(CELL_POS):
+            color, power = board[pos]
+            if color is not None:
+                cells[index] = power if color == PlayerColor.RED else -power
+
+    powers = [
+        board._color_power(PlayerColor.RED),
+        board._color_power(PlayerColor.BLUE)
+    ]
+    player = board.turn_color.value
+    turn = board.turn_count
+    end = MAX_TURNS if max_plies is None else min(MAX_TURNS, turn + max_plies)
+    draw = rng.random
+    slots, spread_cells = _SLOTS, SPREAD_CELLS
+
+    while turn < end:
+        if turn >= 2 and (powers[0] == 0 or powers[1] == 0):
+            break
+        can_spawn = powers[0] + powers[1] < MAX_TOTAL_POWER
+        if powers[player] == 0 and not can_spawn:
+            # No legal actions (only possible in a contrived position).
+            break
+        sign = 1 - 2 * player
+
+        while True:
+            cell, kind = slots[int(draw() * _SLOT_COUNT)]
+            value = cells[cell] * sign
+            if kind == DIR_COUNT:
+                if value == 0 and can_spawn:
+                    # SPAWN: a single token on an empty cell.
+                    cells[cell] = sign
+                    powers[player] += 1
+                    break
+            elif value > 0:
+                # SPREAD: lift the stack off the source cell, then take over
+                # the next `value` cells in the direction, adding a token to
+                # each. Stacks which grow past the maximum power are removed.
+                cells[cell] = 0
+                powers[player] -= value
+                for dest in spread_cells[cell][kind][value]:
+                    power = cells[dest]
+                    if power < 0:
+                        power = -power
+                        powers[1] -= power
+                    else:
+                        powers[0] -= power
+                    if power < MAX_CELL_POWER:
+                        cells[dest] = sign * (power + 1)
+                        powers[player] += power + 1
+                    else:
+                        cells[dest] = 0
+                break
+
+        player ^= 1
+        turn += 1
+
+    diff = powers[0] - powers[1]
+    if diff >= WIN_POWER_DIFF:
+        return PlayerColor.RED
+    if diff <= -WIN_POWER_DIFF:
+        return PlayerColor.BLUE
+    return None
@@ -0,0 +1,68 @@
+# COMP30024 Artificial Intelligence, Semester 1 2023
+# Project Part B: Game Playing Agent
+
+from contextlib import contextmanager
+from typing import Callable, Generator
+
+from .player import PlayerColor
+from .actions import Action
+
+
+# SearchMixin adds a search-oriented "make/unmake" API on top of a board's
+# `apply_action` and `undo_action`. Search code can then walk a single board
+# up and down the game tree instead of copying positions: push an action when
+# descending, pop it when coming back up, and use `try_action` or `rollout`
+# for excursions that must leave the board exactly as they found it.
+#
+# The mixin is shared by both board engines (`Board` and `CompactBoard`).
+# Actions may be given as action objects or as (trusted) integer action ids,
+# as accepted by the board's `apply_action`.
+
+class SearchMixin:
+    __slots__ = ()
+
+    def push(self, action: Action | int):
+        """
+        Play an action (alias of `apply_action`).
+        """
+        self.apply_action(action)
+
+    def pop(self):
+        """
+        Take back the last action played (alias of `undo_action`).
+        """
+        self.undo_action()
+
+    @contextmanager
+    def try_action(
+        self,
+        action: Action | int
+    ) -> Generator['SearchMixin', None, None]:
+        """
+        Context manager which plays an action on entry and takes it back on
+        exit, however the block is left.
+        """
+        self.apply_action(action)
+        try:
+            yield self
+        finally:
+            self.undo_action()
+
+    def rollout(
+        self,
+        policy: Callable[['SearchMixin'], Action | int]
+    ) -> PlayerColor | None:
+        """
+        Play the game out to the end, choosing each action with `policy`
+        (called with this board), then unwind back to the starting position.
+        Return the winner (or None for a draw).
+        """
+        plies = 0
+        try:
+            while not self.game_over:
+                self.apply_action(policy(self))
+                plies += 1
+            return self.winner_color
+        finally:
+            for _ in range(plies):
+                self.undo_action()
@@ -0,0 +1,163 @@
+# COMP30024 Artificial Intelligence, Semester 1 2023
+# Project Part B: Game Playing Agent
+
+from operator import itemgetter
+from typing import Sequence
+
+from .actions import SPREAD_ID_BASE, ACTION_CELLS, ACTION_DIRS
+from .tables import CELL_COUNT, DIR_COUNT, HEX_DIRS, ZOBRIST_CELLS, \
+    ZOBRIST_BLUE_TURN
+from .constants import *
+
+
+# Symmetries of the board. The board is a torus, so every translation of a
+# position is an equivalent position, and so is every rotation or reflection
+# of the hex grid (the linear maps of (r, q) which permute the six `HexDir`
+# vectors, i.e. the 12 elements of the dihedral group D6). Combining the two,
+# transform t = g * CELL_COUNT + a maps cell x to g(x - a) (mod BOARD_N): it
+# moves cell a to the origin, then applies the linear map g. Transform 0 is
+# the identity, and there are 12 * 49 = 588 transforms in total.
+#
+# All transforms are precomputed as cell and direction permutation tables, so
+# that mapping a position, an action or a whole cell array is a table lookup.
+
+_DIR_VECTORS = [(dir.r, dir.q) for dir in HEX_DIRS]
+
+
+def _linear_maps() -> list[tuple[int, int, int, int]]:
+    # A linear map (r, q) -> (a * r + b * q, c * r + d * q) is a symmetry
+    # of the hex grid iff it maps the set of direction vectors onto itself.
+    maps = []
+    for a, c in _DIR_VECTORS:
+        for b, d in _DIR_VECTORS:
+            images = {(a * r + b * q, c * r + d * q) for r, q in _DIR_VECTORS}
+            if images == set(_DIR_VECTORS):
+                maps.append((a, b, c, d))
+    # Keep the identity first, so that transform 0 is the identity.
+    maps.sort(key=lambda m: m != (1, 0, 0, 1))
+    return maps
+
+
+LINEAR_MAPS: tuple[tuple[int, int, int, int], ...] = tuple(_linear_maps())
+TRANSFORM_COUNT = len(LINEAR_MAPS) * CELL_COUNT
+IDENTITY = 0
+
+
+def _map_cell(linear: tuple[int, int, int, int], anchor: int, cell: int):
+    a, b, c, d = linear
+    r = cell // BOARD_N - anchor // BOARD_N
+    q = cell % BOARD_N - anchor % BOARD_N
+    return ((a * r + b * q) % BOARD_N) * BOARD_N + (c * r + d * q) % BOARD_N
+
+
+# CELL_PERMS[t][i] is the cell that transform t maps cell i to.
+CELL_PERMS: tuple[tuple[int, ...], ...] = tuple(
+    tuple(_map_cell(linear, anchor, i) for i in range(CELL_COUNT))
+    for linear in LINEAR_MAPS
+    for anchor in range(CELL_COUNT)
+)
+
+# DIR_PERMS[t][d] is the direction that transform t maps direction d to (this
+# only depends on the linear part of the transform).
+DIR_PERMS: tuple[tuple[int, ...], ...] = tuple(
+    perm
+    for perm in (
+        tuple(
+            _DIR_VECTORS.index((a * r + b * q, c * r + d * q))
+            for r, q in _DIR_VECTORS
+        )
+        for a, b, c, d in LINEAR_MAPS
+    )
+    for _ in range(CELL_COUNT)
+)
+
+_PERM_TRANSFORM: dict[tuple[int, ...], int] = \
+    {perm: t for t, perm in enumerate(CELL_PERMS)}
+
+# INVERSE_TRANSFORMS[t] is the transform which undoes transform t.
+INVERSE_TRANSFORMS: tuple[int, ...] = tuple(
+    _PERM_TRANSFORM[tuple(sorted(range(CELL_COUNT), key=perm.__getitem__))]
+    for perm in CELL_PERMS
+)
+
+# CELL_GATHERS[t] rearranges a sequence of per-cell values into its image
+# under transform t, i.e. CELL_GATHERS[t](values)[perm[i]] == values[i].
+CELL_GATHERS: tuple[itemgetter, ...] = tuple(
+    itemgetter(*CELL_PERMS[INVERSE_TRANSFORMS[t]])
+    for t in range(TRANSFORM_COUNT)
+)
+
+
+def transform_cell(cell: int, transform: int) -> int:
+    """
+    Return the index of the cell that a transform maps a cell index to.
+    """
+    return CELL_PERMS[transform][cell]
+
+
+def transform_action(action: int, transform: int) -> int:
+    """
+    Return the id of the action that a transform maps an action id to.
+    """
+    if action < SPREAD_ID_BASE:
+        return CELL_PERMS[transform][action]
+    return SPREAD_ID_BASE \
+        + CELL_PERMS[transform][ACTION_CELLS[action]] * DIR_COUNT \
+        + DIR_PERMS[transform][ACTION_DIRS[action]]
+
+
+def canonical_cells(
+    cells: Sequence[int],
+    blue_to_move: bool
+) -> tuple[int, int]:
+    """
+    Return the canonical key of a position given as signed per-cell values
+    (as in `CompactBoard`: + RED, - BLUE, magnitude is power), and a transform
+    which maps the position onto its canonical form. Equivalent positions get
+    equal keys, which are the Zobrist keys of their canonical forms.
+    """
+    # The canonical form is the lexicographically smallest image of the cell
+    # values. Only transforms moving one of the rarest (nonzero) cell values
+    # to the origin need to be tried: equivalent positions have the same set
+    # of candidate images.
+    anchor_value, anchor_count = 0, CELL_COUNT + 1
+    for value in set(cells):
+        count = cells.count(value)
+        if value and (count, value) < (anchor_count, anchor_value):
+            anchor_value, anchor_count = value, count
+    if not anchor_value:
+        return _cells_key(cells, blue_to_move), IDENTITY
+
+    best, best_transform = None, IDENTITY
+    start = 0
+    for _ in range(anchor_count):
+        anchor = cells.index(anchor_value, start)
+        start = anchor + 1
+        for transform in range(anchor, TRANSFORM_COUNT, CELL_COUNT):
+            image = CELL_GATHERS[transform](cells)
+            if best is None or image < best:
+                best, best_transform = image, transform
+
+    return _cells_key(best, blue_to_move), best_transform
+
+
+def transform_key(
+    cells: Sequence[int],
+    blue_to_move: bool,
+    transform: int
+) -> int:
+    """
+    Return the Zobrist key of the image under a transform of a position given
+    as signed per-cell values (as in `canonical_cells`).
+    """
+    return _cells_key(CELL_GATHERS[transform](cells), blue_to_move)
+
+
+def _cells_key(cells: Sequence[int], blue_to_move: bool) -> int:
+    key = ZOBRIST_BLUE_TURN if blue_to_move else 0
+    for i, value in enumerate(cells):
+        if value > 0:
+            key ^= ZOBRIST_CELLS[i][0][value]
+        elif value < 0:
+            key ^= ZOBRIST_CELLS[i][1][-value]
+    return key
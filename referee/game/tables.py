@@ -0,0 +1,89 @@
+# COMP30024 Artificial Intelligence, Semester 1 2023
+# Project Part B: Game Playing Agent
+
+from random import Random
+
+from .hex import HexPos, HexDir
+from .constants import *
+
+
+# Precomputed lookup tables for board geometry. Cells are identified by an
+# integer index, with cell (r, q) at index r * BOARD_N + q, and directions by
+# their position in the enumeration order of `HexDir`. All tables are built
+# once at import time, so that the hot paths of the board engines (and agents)
+# never need to do HexVec arithmetic, allocate positions or re-check bounds.
+
+CELL_COUNT = BOARD_N * BOARD_N
+
+# Index <-> direction mapping.
+HEX_DIRS: tuple[HexDir, ...] = tuple(map(HexDir.at, range(len(HexDir))))
+DIR_COUNT = len(HEX_DIRS)
+DIR_INDEX: dict[HexDir, int] = {dir: d for d, dir in enumerate(HEX_DIRS)}
+
+# Index <-> position mapping. HexPos instances are immutable, so the single
+# canonical instance per cell is used everywhere a position is needed.
+CELL_POS: tuple[HexPos, ...] = tuple(map(HexPos.at, range(CELL_COUNT)))
+CELL_INDEX: dict[HexPos, int] = {pos: i for i, pos in enumerate(CELL_POS)}
+
+
+def cell_index(pos: HexPos) -> int:
+    """
+    Return the index of a board position (cheaper than a CELL_INDEX lookup,
+    which has to hash the position).
+    """
+    return pos.r * BOARD_N + pos.q
+
+
+def _wrapped_index(r: int, q: int) -> int:
+    return (r % BOARD_N) * BOARD_N + (q % BOARD_N)
+
+
+# SPREAD_CELLS[i][d][p] is the tuple of cell indices reached, in order, by
+# spreading a stack of power p from cell i in direction d (wrapping around the
+# torus). Entries for p = 0 are empty.
+SPREAD_CELLS: tuple[tuple[tuple[tuple[int, ...], ...], ...], ...] = tuple(
+    tuple(
+        tuple(
+            tuple(
+                _wrapped_index(pos.r + dir.r * k, pos.q + dir.q * k)
+                for k in range(1, power + 1)
+            )
+            for power in range(MAX_CELL_POWER + 1)
+        )
+        for dir in HEX_DIRS
+    )
+    for pos in CELL_POS
+)
+
+# NEIGHBOURS[i] is the tuple of the six cells adjacent to cell i, in
+# direction order, i.e. NEIGHBOURS[i][d] == SPREAD_CELLS[i][d][1][0].
+NEIGHBOURS: tuple[tuple[int, ...], ...] = tuple(
+    tuple(by_dir[d][1][0] for d in range(DIR_COUNT))
+    for by_dir in SPREAD_CELLS
+)
+
+# Zobrist hashing keys. ZOBRIST_CELLS[i][c][p] is a random 64-bit key for cell
+# i holding a stack of power p owned by the player with `PlayerColor` value c
+# (zero for p = 0, so empty cells contribute nothing), and ZOBRIST_BLUE_TURN
+# is mixed in whenever BLUE is to move. A position's key is the XOR of the
+# keys of its features, so it can be updated incrementally as cells change.
+# The generator is seeded so that keys are stable across processes.
+_zobrist_rng = Random(30024)
+
+ZOBRIST_CELLS: tuple[tuple[tuple[int, ...], ...], ...] = tuple(
+    tuple(
+        (0,) + tuple(
+            _zobrist_rng.getrandbits(64) for _ in range(MAX_CELL_POWER)
+        )
+        for _ in range(NUM_PLAYERS)
+    )
+    for _ in range(CELL_COUNT)
+)
+ZOBRIST_BLUE_TURN: int = _zobrist_rng.getrandbits(64)
+
+# A random 64-bit key per turn count, for search code to mix into position
+# keys where the turn matters (the game ends at MAX_TURNS, and the same board
+# can come up again at another turn, as spreads can be undone). The board
+# keys themselves leave the turn out, so that equal boards share a key.
+ZOBRIST_TURNS: tuple[int, ...] = tuple(
+    _zobrist_rng.getrandbits(64) for _ in range(MAX_TURNS + 1))
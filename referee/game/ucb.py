@@ -0,0 +1,110 @@
+# COMP30024 Artificial Intelligence, Semester 1 2023
+# Project Part B: Game Playing Agent
+
+import sys
+from array import array
+from math import log, sqrt
+from typing import Sequence
+
+
+# A selection kernel for UCT-style tree search: pick the child with the
+# highest UCB1 value
+#
+#   score / visits + c * sqrt(log(parent_visits) / visits)
+#
+# in one pass over the children, with no per-child calls to `math.log` or
+# `math.sqrt`. The search trees keep their statistics in typed arrays indexed
+# by node, so the kernel takes those arrays and the children's indices. Trees
+# that score every node from the searching agent's point of view select at
+# the opponent's nodes with `minimise`, which scores a child by
+# 1 - score / visits instead.
+#
+# sqrt(log(N)) is looked up once per selection, and 1/n and 1/sqrt(n) once
+# per child, in tables built at import time for visit counts up to
+# VISIT_CAP (counts past it fall back to computing them). Nodes with at
+# least NUMPY_MIN_CHILDREN children are scored as one numpy array instead,
+# but only once something else has imported numpy: it is optional, and
+# loading it just for selection would add tens of MB to the peak memory
+# which the referee counts against an agent's space limit.
+
+VISIT_CAP = 1 << 16
+NUMPY_MIN_CHILDREN = 48
+
+SQRT_LOG = array('d', [0.0]) + array(
+    'd', (sqrt(log(n)) for n in range(1, VISIT_CAP + 1)))
+INV = array('d', [0.0]) + array(
+    'd', (1 / n for n in range(1, VISIT_CAP + 1)))
+INV_SQRT = array('d', [0.0]) + array(
+    'd', (1 / sqrt(n) for n in range(1, VISIT_CAP + 1)))
+
+
+def ucb_select(
+    children: Sequence[int],
+    visits: Sequence[int],
+    scores: Sequence[float],
+    parent_visits: int,
+    c: float,
+    minimise: bool = False
+) -> int:
+    """
+    Return the position in `children` (node indices into the `visits` and
+    `scores` arrays) of the child with the highest UCB1 value, for exploration
+    weight `c`. An unvisited child is picked first, and ties go to the first
+    child. With `minimise`, a child's mean score counts against it (as
+    1 - mean). `children` must not be empty.
+    """
+    sign = -1.0 if minimise else 1.0
+    if len(children) >= NUMPY_MIN_CHILDREN and "numpy" in sys.modules:
+        return _ucb_select_numpy(
+            children, visits, scores, parent_visits, c, sign)
+    try:
+        c_log = c * SQRT_LOG[parent_visits]
+        inv, inv_sqrt = INV, INV_SQRT
+        best = 0
+        best_value = -1e300
+        for i, child in enumerate(children):
+            n = visits[child]
+            if n <= 0:
+                return i
+            value = sign * scores[child] * inv[n] + c_log * inv_sqrt[n]
+            if value > best_value:
+                best = i
+                best_value = value
+        return best
+    except IndexError:
+        # a visit count past the tables
+        return _ucb_select_exact(
+            children, visits, scores, parent_visits, c, sign)
+
+
+def _sqrt_log(n):
+    return SQRT_LOG[n] if n <= VISIT_CAP else sqrt(log(n))
+
+
+def _ucb_select_exact(children, visits, scores, parent_visits, c, sign):
+    c_log = c * _sqrt_log(parent_visits)
+    best = 0
+    best_value = -1e300
+    for i, child in enumerate(children):
+        n = visits[child]
+        if n <= 0:
+            return i
+        value = sign * scores[child] / n + c_log / sqrt(n)
+        if value > best_value:
+            best = i
+            best_value = value
+    return best
+
+
+def _ucb_select_numpy(children, visits, scores, parent_visits, c, sign):
+    import numpy as np
+    index = np.fromiter(children, dtype=np.intp, count=len(children))
+    # (the views of the arrays only last for the indexing: an array.array
+    # can't grow while it has one)
+    n = np.asarray(visits)[index].astype(np.float64)
+    unvisited = np.flatnonzero(n <= 0)
+    if len(unvisited):
+        return int(unvisited[0])
+    value = sign * np.asarray(scores)[index] / n \
+        + c * _sqrt_log(parent_visits) / np.sqrt(n)
+    return int(value.argmax())